@@ -1,5 +1,6 @@
 from pathlib import Path
 import sys
+import datetime as dt
 import numpy as np
 import pandas as pd
 import argparse
@@ -8,25 +9,51 @@ import argparse
 project_root = Path(__file__).resolve().parents[3] / "project"
 sys.path.append(str(project_root))
 
-from simulator.scenarios.room_heater.utils.temp import simulate_temperature, interpolate_temperatures
+from simulator.scenarios.room_heater.utils.temp import simulate_temperature, interpolate_temperatures, VANCOUVER, weather_store
 #from simulator.scenarios.room_heater.room_heater import simulate_window_markov
 
+MONTHS = [1, 2, 3, 4, 10, 11, 12]
+DAYS = range(1, 29)
+HOURS = range(0, 21)
 
 
-def main():
+def fetch_month(month):
+    """
+    Return the sampled hours of a month, fetching the whole month with a single request.
+    Months already in the weather store are not fetched again, so an interrupted run resumes
+    where it stopped.
+    """
+
+    first, last = dt.date(2023, month, DAYS[0]), dt.date(2023, month, DAYS[-1])
+    days = list(pd.date_range(first, last, freq='D').date)
+    if not weather_store.has_days(VANCOUVER, days):
+        weather_store.prefetch(VANCOUVER, first, last)
 
-    all_temperatures = pd.DataFrame()
+    month_data = weather_store.get(VANCOUVER, dt.datetime.combine(first, dt.time(0)),
+                                   dt.datetime.combine(last, dt.time(23)))
+    return month_data[month_data.index.hour.isin(HOURS)]
 
-    for i in [1, 2, 3, 4, 10, 11, 12]: # months
-        for j in range(1,29):
-            for k in range (0,21):
 
-                temperature = simulate_temperature(j, i, k, k)
-                all_temperatures = pd.concat([all_temperatures, temperature])
-                print(f"Simulated temperature for month {i}, day {j}, hour {k}")
-    
+def main():
+    parser = argparse.ArgumentParser(description="Build the outside temperature distribution dataset.")
+    parser.add_argument("--hourly", action="store_true",
+                        help="Request every hour separately instead of fetching whole months.")
+    args = parser.parse_args()
+
+    temperatures = []
+
+    for i in MONTHS: # months
+        if args.hourly:
+            for j in DAYS:
+                for k in HOURS:
+                    temperatures.append(simulate_temperature(j, i, k, k))
+        else:
+            temperatures.append(fetch_month(i))
+        print(f"Simulated temperature for month {i}")
+
+    all_temperatures = pd.concat(temperatures)
     print(f"Num of temp entries: {len(all_temperatures)}")
     all_temperatures.to_csv(project_root / "evaluation" / "simulation_results" / "clean_data"/"all_temperatures.csv", index=False)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
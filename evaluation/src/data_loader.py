@@ -1,7 +1,60 @@
 import os
+import sys
 import pandas as pd
 
-def load_data(controller, sim_type, res_path=None):
+# Result files are read by the simulator module that writes them, so both sides share one reader
+SIMULATOR_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                             "simulator")
+if SIMULATOR_DIR not in sys.path:
+    sys.path.append(SIMULATOR_DIR)
+from simulation_engine.result_writer import read_results as read_result_file, read_metadata
+
+# Result files a run may have, one per run. The parts folder
+# is left by a streamed NPZ run that was interrupted before merging its parts.
+RESULT_FILES = ("simulation_results.npz", "simulation_results.parquet", "simulation_results.csv",
+                "simulation_results.parts")
+
+def read_results(path, columns=None):
+    """
+    Read one result file in CSV, NPZ or Parquet format with the simulator reader, decoding only
+    the selected columns. Column names have '.' replaced with '_'.
+
+    Args:
+        path (str): The result file, or the parts folder of an interrupted streamed run.
+        columns (List[str]): The columns to read, with '.' or '_'. Default reads every column.
+
+    Returns:
+        pd.DataFrame: The selected columns.
+    """
+    frame, _ = read_result_file(path, columns)
+    return frame.rename(columns={name: name.replace('.', '_') for name in frame.columns})
+
+def find_results(sim_path):
+    """
+    Return the result file of a run folder, or None if it has none.
+
+    Raises:
+        ValueError: If the folder holds results in more than one format, as it is not known which is current.
+    """
+    paths = [os.path.join(sim_path, name) for name in RESULT_FILES if os.path.exists(os.path.join(sim_path, name))]
+    if len(paths) > 1:
+        raise ValueError(f"Run folder {sim_path} holds several result files: "
+                         f"{[os.path.basename(path) for path in paths]}")
+    return paths[0] if paths else None
+
+def fingerprint(sim_path):
+    """
+    Describe the result file of a run by its name, modification time and size, to tell whether
+    the run changed since it was last read.
+    """
+    result_file = find_results(sim_path)
+    stat = os.stat(result_file)
+    return [os.path.basename(result_file), stat.st_mtime_ns, stat.st_size]
+
+def resolve_res_path(res_path=None):
+    """
+    Return the raw results folder, looked up from the current directory when res_path is None.
+    """
     if res_path is None:
         # Get the current directory
         current_dir = os.getcwd()
@@ -14,17 +67,26 @@ def load_data(controller, sim_type, res_path=None):
         if not os.path.exists(res_path):
             parent_dir = os.path.dirname(current_dir)
             res_path = os.path.join(parent_dir, "evaluation", "simulation_results/raw_data")
-            
-    folder = os.path.join(res_path, sim_type, controller)
+    return res_path
+
+def run_folders(controller, sim_type, res_path=None):
+    """
+    Return the folders of every run of a controller and scenario that has results, in load order.
+    """
+    folder = os.path.join(resolve_res_path(res_path), sim_type, controller)
     if not os.path.exists(folder):
         raise FileNotFoundError(f"Folder {folder} does not exist.")
+    sim_paths = (os.path.join(folder, sim_dir) for sim_dir in sorted(os.listdir(folder)))
+    return [sim_path for sim_path in sim_paths if find_results(sim_path) is not None]
+
+def load_data(controller, sim_type, res_path=None, columns=None):
+    """
+    Load the results of every run of a controller and scenario, in any supported format.
+    Only the given columns are read when columns is set.
+    """
     dataframe = []
-    for sim_dir in sorted(os.listdir(folder)):
-        sim_path = os.path.join(folder, sim_dir, "simulation_results.csv")
-        if os.path.exists(sim_path):
-            frame = pd.read_csv(sim_path)
-            frame = frame.rename(columns=lambda x: x.replace('.', '_'))
-            dataframe.append(frame)
+    for sim_path in run_folders(controller, sim_type, res_path):
+        dataframe.append(read_results(find_results(sim_path), columns))
             
 
     return dataframe
@@ -0,0 +1,210 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from src.data_loader import resolve_res_path, run_folders, find_results, read_results, read_metadata, fingerprint
+
+# Index of a store folder, next to one `<column>.npy` array per variable
+STORE_INDEX = "index.json"
+
+def _sources(sim_paths):
+    """
+    Describe the result files of the runs, to tell whether a store is out of date.
+    """
+    return [[os.path.basename(sim_path)] + fingerprint(sim_path) for sim_path in sim_paths]
+
+def _run_seed(sim_path, result_file):
+    """
+    Return the seed of a run from its metadata.json, or from the metadata stored in its result file.
+    """
+    metadata_file = os.path.join(sim_path, "metadata.json")
+    if os.path.exists(metadata_file):
+        with open(metadata_file) as f:
+            metadata = json.load(f)
+    else:
+        metadata = read_metadata(result_file)
+    return metadata.get("seed")
+
+class EnsembleStore:
+    """
+    The trajectories of all runs of a controller and scenario, with each variable stored as one
+    memory-mapped float64 array of shape (runs x steps). Runs shorter than the longest one are padded
+    with NaN. Arrays are only mapped when first accessed and pages are only read when touched, so
+    metrics and plots can go through thousands of runs without loading them into memory.
+
+    Attributes:
+        path (str): The store folder.
+        columns (List[str]): The stored variables, with '.' replaced with '_' as in `load_data`.
+        runs (List[str]): The run folder names, in `load_data` order.
+        lengths (np.ndarray): The number of rows of each run.
+        seeds (List[int]): The seed of each run, None when its metadata is not available.
+        steps (int): The number of columns of the arrays, i.e. the length of the longest run.
+    """
+
+    def __init__(self, path):
+        """
+        Open an existing store.
+
+        Args:
+            path (str): The store folder, as written by `build`.
+        """
+        with open(os.path.join(path, STORE_INDEX)) as f:
+            index = json.load(f)
+        self.path = path
+        self.columns = index["columns"]
+        self.runs = index["runs"]
+        self.lengths = np.array(index["lengths"], dtype=np.int64)
+        self.seeds = index["seeds"]
+        self.steps = index["steps"]
+        self.sources = index["sources"]
+        self._arrays = {}
+
+    @classmethod
+    def build(cls, sim_paths, path, columns=None):
+        """
+        Write a store from the results of the given runs, reading every run once. The store is written
+        next to path and moved in place when complete, replacing any previous store.
+
+        Args:
+            sim_paths (List[str]): The run folders, as returned by `run_folders`.
+            path (str): The store folder.
+            columns (List[str]): The variables to store, with '.' or '_'. Default stores every column of the first run.
+
+        Returns:
+            EnsembleStore: The new store.
+
+        Raises:
+            ValueError: If there are no runs.
+            KeyError: If a run does not have one of the columns.
+        """
+        if not sim_paths:
+            raise ValueError("No simulation results to store")
+        result_files = [find_results(sim_path) for sim_path in sim_paths]
+        if columns is not None:
+            columns = [column.replace('.', '_') for column in columns]
+
+        partial = f"{path}.partial"
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+        # The run lengths are only known once read, so each column is first appended run after run
+        # to a flat file, then copied to its padded array
+        lengths = []
+        flat = {}
+        try:
+            for result_file in result_files:
+                frame = read_results(result_file, columns)
+                if columns is None:
+                    columns = list(frame.columns)
+                if not flat:
+                    flat = {column: open(os.path.join(partial, f"{column}.flat"), "wb") for column in columns}
+                lengths.append(len(frame))
+                for column in columns:
+                    frame[column].to_numpy(dtype=np.float64).tofile(flat[column])
+        finally:
+            for f in flat.values():
+                f.close()
+        steps = max(lengths)
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+        for column in columns:
+            flat_file = os.path.join(partial, f"{column}.flat")
+            values = np.memmap(flat_file, dtype=np.float64, mode='r') if offsets[-1] else np.empty(0)
+            array = np.lib.format.open_memmap(os.path.join(partial, f"{column}.npy"), mode='w+',
+                                              dtype=np.float64, shape=(len(sim_paths), steps))
+            array[:] = np.nan
+            for i, length in enumerate(lengths):
+                array[i, :length] = values[offsets[i]:offsets[i + 1]]
+            array.flush()
+            del array, values
+            os.remove(flat_file)
+
+        index = {
+            "columns": columns,
+            "runs": [os.path.basename(sim_path) for sim_path in sim_paths],
+            "lengths": lengths,
+            "seeds": [_run_seed(sim_path, result_file) for sim_path, result_file in zip(sim_paths, result_files)],
+            "steps": steps,
+            "sources": _sources(sim_paths)
+        }
+        with open(os.path.join(partial, STORE_INDEX), "w") as f:
+            json.dump(index, f, indent=2)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(partial, path)
+        return cls(path)
+
+    def __len__(self):
+        return len(self.runs)
+
+    def column(self, name):
+        """
+        Return the (runs x steps) read-only memory-mapped array of a variable.
+
+        Args:
+            name (str): The variable name, with '.' or '_'.
+
+        Raises:
+            KeyError: If the variable is not in the store.
+        """
+        name = name.replace('.', '_')
+        if name not in self.columns:
+            raise KeyError(f"Column '{name}' not found in the ensemble store")
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+        return self._arrays[name]
+
+    def run(self, i, columns=None):
+        """
+        Return run i as a DataFrame whose columns are views of the memory-mapped arrays, without the padding.
+
+        Args:
+            i (int): The run position, in `runs` order.
+            columns (List[str]): The columns to include, with '.' or '_'. Default includes every stored column.
+
+        Returns:
+            pd.DataFrame: The run, with the same columns as `read_results` gives for its result file.
+        """
+        columns = self.columns if columns is None else [column.replace('.', '_') for column in columns]
+        length = self.lengths[i]
+        return pd.DataFrame({column: self.column(column)[i, :length] for column in columns}, copy=False)
+
+    def load_data(self, columns=None):
+        """
+        Return every run as in `data_loader.load_data`, as zero-copy views of the store.
+        """
+        return [self.run(i, columns) for i in range(len(self))]
+
+    def is_current(self, sim_paths, columns=None):
+        """
+        Tell whether the store holds the current results of the given runs and all the given columns.
+        """
+        if columns is not None and not {column.replace('.', '_') for column in columns} <= set(self.columns):
+            return False
+        return self.sources == _sources(sim_paths)
+
+def load_store(controller, sim_type, res_path=None, store_path=None, columns=None, rebuild=False):
+    """
+    Open the ensemble store of a controller and scenario, building it from the raw results when it
+    does not exist, is out of date or lacks some of the columns.
+
+    Args:
+        controller (str): The controller name.
+        sim_type (str): The scenario name.
+        res_path (str): The raw results folder. Default is looked up as in `load_data`.
+        store_path (str): The folder holding the stores. Default is `ensemble_store` next to the raw results folder.
+        columns (List[str]): The variables needed, with '.' or '_'. Default stores every column.
+        rebuild (bool): Build the store even if it is current.
+
+    Returns:
+        EnsembleStore: The store.
+    """
+    res_path = os.path.normpath(resolve_res_path(res_path))
+    if store_path is None:
+        store_path = os.path.join(os.path.dirname(res_path), "ensemble_store")
+    path = os.path.join(store_path, sim_type, controller)
+    sim_paths = run_folders(controller, sim_type, res_path)
+    if not rebuild and os.path.exists(os.path.join(path, STORE_INDEX)):
+        store = EnsembleStore(path)
+        if store.is_current(sim_paths, columns):
+            return store
+    return EnsembleStore.build(sim_paths, path, columns)
@@ -1,42 +1,175 @@
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
 import numpy as np
 import pandas as pd
 import scipy.stats as stats
+from src.ensemble_store import EnsembleStore
+
+# Every metric scans the run with whole-array NumPy operations, in O(n). Reductions skip NaN like
+# the pandas reductions they replace.
+
+def _nan_reduce(reduction, values: np.ndarray) -> float:
+    """
+    Apply a reduction to the non-NaN values, giving NaN when there are none.
+    """
+    values = values[~np.isnan(values)]
+    return reduction(values) if len(values) else np.nan
+
+class RunSignals:
+    """
+    The signals of one run, with the intermediates shared by several metrics (band mask, settling
+    index, disturbance windows) computed on first use and kept for the other metrics.
+
+    Attributes:
+        data (Mapping[str, np.ndarray]): The run columns, a DataFrame or a dict of 1-D arrays.
+        output_var (str): The controlled variable.
+        target (float): The setpoint.
+        disturbance_src (str): The column whose state 2 marks a disturbance.
+    """
+
+    def __init__(self, data, output_var: str, target: float, disturbance_src: str):
+        self.data = data
+        self.output_var = output_var
+        self.target = target
+        self.disturbance_src = disturbance_src
+
+    def column(self, name: str) -> np.ndarray:
+        return np.asarray(self.data[name])
+
+    @cached_property
+    def time(self) -> np.ndarray:
+        return self.column('time')
+
+    @cached_property
+    def output(self) -> np.ndarray:
+        return self.column(self.output_var)
+
+    @cached_property
+    def settling_index(self) -> int:
+        """
+        The first index from which the output stays within 2.5% of the target, or None.
+        """
+        within_band = np.abs(self.output - self.target) < 0.025 * abs(self.target)
+        # stays_within[i] is True when every sample from i to the end is within the band
+        stays_within = np.logical_and.accumulate(within_band[::-1])[::-1]
+        if len(stays_within) == 0 or not stays_within[-1]:
+            return None
+        return int(np.argmax(stays_within))
+
+    @cached_property
+    def settling_time(self) -> float:
+        if self.settling_index is None:
+            return self.time[-1]  # No settling time found, return last time as penalty
+        return self.time[self.settling_index]
+
+    @cached_property
+    def steady_values(self) -> np.ndarray:
+        """
+        The output samples from the settling time on.
+        """
+        return self.output[self.time >= self.settling_time]
+
+    @cached_property
+    def disturbance_windows(self):
+        """
+        The (first, end) indices of the windows that start where a disturbance ends, each running to
+        the end of the next disturbance or of the run.
+        """
+        disturbance = self.column(self.disturbance_src)
+        # A disturbance ends where its source leaves state 2
+        starts = np.flatnonzero((disturbance[1:] != disturbance[:-1]) & (disturbance[:-1] == 2)) + 1
+        first = np.searchsorted(self.time, self.time[starts], side='left')
+        end = np.append(np.searchsorted(self.time, self.time[starts[1:]], side='left'), len(self.time))
+        return first, end[:len(starts)]
+
+
+def _settling_time(run: RunSignals) -> float:
+    return run.settling_time
+
+def _steady_state_error(run: RunSignals) -> float:
+    if len(run.steady_values) < 2:
+        return np.nan  # No data after settling time
+    return _nan_reduce(np.mean, run.steady_values - run.target)
 
-def settling_time(data: pd.DataFrame, output_var: str, target_val: float, disturbance_src: str) -> float:
-    tolerance_band = 0.025 * abs(target_val)
-    signal = data[output_var].values
-    time = data['time'].values
+def _overshoot(run: RunSignals) -> float:
+    return _nan_reduce(np.max, run.output) - run.target
+
+def _rise_time(run: RunSignals) -> float:
+    risen = run.output >= 0.985 * run.target
+    index = np.argmax(risen)
+    if not risen[index]:
+        return run.time[-1]  # Default to last time if no rise time found
+    return run.time[index]
+
+def _mean_square_error(run: RunSignals) -> float:
+    return np.nansum((run.target - run.output) ** 2) / len(run.output)
+
+def _energy_consumed(run: RunSignals) -> float:
+    return np.nansum(run.column("heatSourcePower")) / (3600 * 1000)  # Convert to kWh
 
-    for i in range(len(signal)):
-        within_band = np.abs(signal[i:] - target_val) < tolerance_band
-        if np.all(within_band):
-            return time[i]  # Settling time found, return it
+def _comfort_time(run: RunSignals) -> int:
+    return int(np.count_nonzero(np.abs(run.output - run.target) < 0.025 * run.target))
 
-    return time[-1]  # No settling time found, return last time as penalty
+def _variance_after_settling(run: RunSignals) -> float:
+    if len(run.steady_values) < 2:
+        return np.nan  # No data after settling time
+    return _nan_reduce(np.var, run.steady_values)
+
+def _number_of_oscillations(run: RunSignals) -> int:
+    current, previous = run.output[1:], run.output[:-1]
+    # Crossings of the target in either direction
+    crossings = ((current >= run.target) & (previous < run.target)) | \
+                ((current <= run.target) & (previous > run.target))
+    return int(np.count_nonzero(crossings))
+
+def _recovery_time(run: RunSignals) -> float:
+    first, end = run.disturbance_windows
+    if len(first) == 0: return np.nan
+
+    # next_recovered[i] is the first index from i on where the output is back within 1.5% of the target
+    n = len(run.time)
+    recovered = np.abs(run.target - run.output) <= 0.015 * abs(run.target)
+    next_recovered = np.minimum.accumulate(np.where(recovered, np.arange(n), n)[::-1])[::-1]
+    recovery = next_recovered[first]
+    # Windows without recovery count their whole length
+    recovery = np.where(recovery < end, recovery, end - 1)
+    return np.mean(run.time[recovery] - run.time[first])
+
+# Metric kernels by name, in the order of the statistics tables
+METRIC_KERNELS = {
+    'steady_state_error': _steady_state_error,
+    'mean_square_error': _mean_square_error,
+    'overshoot': _overshoot,
+    'rise_time': _rise_time,
+    'settling_time': _settling_time,
+    'comfort_time': _comfort_time,
+    'energy_consumed': _energy_consumed,
+    'variance_after_settling': _variance_after_settling,
+    'recovery_time': _recovery_time,
+    'number_of_oscillations': _number_of_oscillations,
+}
+
+
+def settling_time(data: pd.DataFrame, output_var: str, target_val: float, disturbance_src: str) -> float:
+    return _settling_time(RunSignals(data, output_var, target_val, disturbance_src))
 
 
 
 def steady_state_error(data: pd.DataFrame, output_var: str, target_var: float, disturbance_src: str) -> float:
-    
+
     if output_var not in data.columns :
         raise ValueError("Output or target variable not found in DataFrame.")
 
-    settling_t = settling_time(data,output_var, target_var, disturbance_src)
-    steady_data = data[data['time'] >= settling_t]
-    if steady_data.empty or len(steady_data) < 2:
-        return np.nan  # No data after settling time
-    steady_state_error_value = np.mean(steady_data[output_var] - target_var)
-   
-    return steady_state_error_value
+    return _steady_state_error(RunSignals(data, output_var, target_var, disturbance_src))
 
 
 def overshoot(data: pd.DataFrame, output_var: str, target_var: float, disturbance_src: str) -> float:
-    
+
     if output_var not in data.columns :
         raise ValueError("Output or target variable not found in DataFrame.")
 
-    overshoot_value = np.max(data[output_var]) - target_var
-    return overshoot_value
+    return _overshoot(RunSignals(data, output_var, target_var, disturbance_src))
 
 
 
@@ -45,60 +178,39 @@ def rise_time(data: pd.DataFrame, output_var: str, target_var: float, disturbanc
 
     if output_var not in data.columns :
         raise ValueError("Output or target variable not found in DataFrame.")
-    
-    rise_time = data['time'].iloc[-1]  # Default to last time if no rise time found
-    for row in data.itertuples():
-        if getattr(row, output_var) >= 0.985 * target_var:
-            rise_time = getattr(row, 'time')
-            break
-    
-    
-    return rise_time
+
+    return _rise_time(RunSignals(data, output_var, target_var, disturbance_src))
 
 
 def mean_square_error(data: pd.DataFrame, output_var: str, target_var: float, disturbance_src: str) -> float:
 
     if output_var not in data.columns :
         raise ValueError("Output or target variable not found in DataFrame.")
-    
-    mse = ((target_var - data[output_var]) ** 2).sum() / len(data)
-    return mse 
+
+    return _mean_square_error(RunSignals(data, output_var, target_var, disturbance_src))
 
 
 def energy_consumed(data: pd.DataFrame, output_var: str, target_var: float, disturbance_src: str) -> float:
 
     if output_var not in data.columns:
         raise ValueError("Output variable not found in DataFrame.")
-    
-    energy = np.sum(data["heatSourcePower"]) / (3600 * 1000)  # Convert to kWh
 
-    return energy
+    return _energy_consumed(RunSignals(data, output_var, target_var, disturbance_src))
 
 
 def comfort_time(data: pd.DataFrame, output_var: str, target_var: float, disturbance_src: str) -> float:
 
     if output_var not in data.columns :
         raise ValueError("Output or target variable not found in DataFrame.")
-    
-    comfort_time = 0
-    for row in data.itertuples():
-        if abs(getattr(row, output_var) - target_var) < 0.025 * target_var:
-            comfort_time += 1
-    
-    return comfort_time
+
+    return _comfort_time(RunSignals(data, output_var, target_var, disturbance_src))
 
 def variance_after_settling(data: pd.DataFrame, output_var: str, target_var: float, disturbance_src: str) -> float:
 
     if output_var not in data.columns :
         raise ValueError("Output or target variable not found in DataFrame.")
-    
-    settling_time_value = settling_time(data, output_var, target_var, disturbance_src)
-    steady_data = data[data['time'] >= settling_time_value]
-    if steady_data.empty or len(steady_data) < 2:
-        return np.nan  # No data after settling time
-    variance_value = np.var(steady_data[output_var])
 
-    return variance_value
+    return _variance_after_settling(RunSignals(data, output_var, target_var, disturbance_src))
 
 
 
@@ -106,49 +218,99 @@ def number_of_oscillations(data: pd.DataFrame, output_var: str, target_var: floa
 
     if output_var not in data.columns :
         raise ValueError("Output or target variable not found in DataFrame.")
-    
-    oscillations = 0
-    for i in range(1, len(data)):
-        if (data[output_var].iloc[i] >= target_var and 
-            data[output_var].iloc[i-1] < target_var) or \
-           (data[output_var].iloc[i] <= target_var and 
-            data[output_var].iloc[i-1] > target_var):
-            oscillations += 1
-    
-    return oscillations
+
+    return _number_of_oscillations(RunSignals(data, output_var, target_var, disturbance_src))
 
 
 def recovery_time(data: pd.DataFrame, output_var: str, target_var: float, disturbance_src: str) -> float:
 
     if output_var not in data.columns :
         raise ValueError("Output or target variable not found in DataFrame.")
-    
-    disturbance_times = data['time'][ (data[disturbance_src] != data[disturbance_src].shift(1)) &
-    (data[disturbance_src].shift(1) == 2)]
-    
-    #print(f"Disturbance times: {disturbance_times}") 
-    recovery_times = []
-    
-    if disturbance_times.empty: return np.nan
-
-    for i in range(len(disturbance_times)):
-        start_time = disturbance_times.iloc[i]
-        if (i < len(disturbance_times)- 1):
-            end_time = disturbance_times.iloc[i+1]
-            data_slice = data[(data['time'] >= start_time) & (data['time'] < end_time)]
-        else:
-            data_slice = data[data['time'] >= start_time]
-    
-
-        time_at_recovery = data_slice['time'][abs(target_var - data_slice[output_var]) <= 
-                                                0.015 * abs(target_var)]
-        if time_at_recovery.empty:  
-            recovery_times.append(data_slice['time'].iloc[-1] - data_slice['time'].iloc[0])
-            continue
-        time_at_recovery = time_at_recovery.iloc[0]
-        recovery_duration = time_at_recovery - data_slice['time'].iloc[0]
-        recovery_times.append(recovery_duration)
-
-
-    return np.mean(recovery_times)
 
+    return _recovery_time(RunSignals(data, output_var, target_var, disturbance_src))
+
+
+def _batch_size(batch) -> int:
+    if isinstance(batch, Mapping):
+        return len(batch['time'])
+    return len(batch)
+
+def _batch_run(batch, i):
+    """
+    Return run i of a batch as a DataFrame or a dict of 1-D arrays, without padding.
+    """
+    if isinstance(batch, EnsembleStore):
+        return {name: batch.column(name)[i, :batch.lengths[i]] for name in batch.columns}
+    if isinstance(batch, Mapping):
+        # Padded (runs x steps) arrays: the run ends where its time does
+        length = int(np.count_nonzero(~np.isnan(batch['time'][i])))
+        return {name: values[i, :length] for name, values in batch.items()}
+    return batch[i]
+
+def _evaluate_runs(batch, indices, output_var, target, disturbance_src, names):
+    """
+    Compute the metrics of some runs of a batch, one row of values per run.
+    """
+    if isinstance(batch, str):
+        # Workers reopen the store instead of receiving its arrays
+        batch = EnsembleStore(batch)
+    values = np.empty((len(indices), len(names)))
+    for row, i in enumerate(indices):
+        run = RunSignals(_batch_run(batch, i), output_var, target, disturbance_src)
+        values[row] = [METRIC_KERNELS[name](run) for name in names]
+    return values
+
+def _chunk_args(batch, chunk):
+    """
+    Return the part of a batch a worker needs for some runs, with their indices in that part.
+    """
+    if isinstance(batch, EnsembleStore):
+        return batch.path, chunk
+    if isinstance(batch, Mapping):
+        return {name: values[chunk] for name, values in batch.items()}, range(len(chunk))
+    return [batch[i] for i in chunk], range(len(chunk))
+
+def compute_metrics(batch, output_var: str, target: float, disturbance_src: str, metrics=None,
+                    controller: str = None, jobs: int = 1) -> pd.DataFrame:
+    """
+    Compute several metrics over all runs of a batch in one pass, computing the intermediates shared
+    by the metrics of a run (band mask, settling index, disturbance windows) once.
+
+    Args:
+        batch: The runs, as the list of DataFrames returned by `load_data`, an `EnsembleStore`, or a
+               dict of NaN-padded (runs x steps) arrays by column name, including 'time'.
+        output_var (str): The controlled variable.
+        target (float): The setpoint.
+        disturbance_src (str): The column whose state 2 marks a disturbance.
+        metrics (List): Metric names or functions of this module. Default computes every metric.
+        controller (str): The value of the controller column, e.g. the scenario name.
+        jobs (int): Number of worker processes the runs are split across. Default is 1.
+
+    Returns:
+        pd.DataFrame: One row per metric and run, with the controller, run, metric and value columns
+        of the `statistics/*_all.csv` tables, ordered by metric then run.
+
+    Raises:
+        ValueError: If a metric is unknown.
+    """
+    names = [getattr(metric, '__name__', metric) for metric in (metrics or METRIC_KERNELS)]
+    unknown = [name for name in names if name not in METRIC_KERNELS]
+    if unknown:
+        raise ValueError(f"Unknown metrics {unknown}, expected some of {list(METRIC_KERNELS)}")
+
+    n_runs = _batch_size(batch)
+    if jobs == 1 or n_runs < 2:
+        values = _evaluate_runs(batch, range(n_runs), output_var, target, disturbance_src, names)
+    else:
+        chunks = [chunk for chunk in np.array_split(np.arange(n_runs), jobs * 4) if len(chunk)]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(_evaluate_runs, *_chunk_args(batch, chunk), output_var, target, disturbance_src, names)
+                       for chunk in chunks]
+            values = np.concatenate([future.result() for future in futures])
+
+    return pd.DataFrame({
+        'controller': controller,
+        'run': np.tile(np.arange(n_runs), len(names)),
+        'metric': np.repeat(names, n_runs),
+        'value': values.T.ravel()
+    })
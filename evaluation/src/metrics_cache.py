@@ -0,0 +1,96 @@
+import hashlib
+import os
+import json
+import pandas as pd
+from src import metrics as metrics_module
+from src.data_loader import run_folders, find_results, read_results, fingerprint
+from src.metrics import compute_metrics, METRIC_KERNELS
+
+def metrics_version():
+    """
+    Return the digest of the metric code, so that changing a metric invalidates the cached values.
+    """
+    with open(metrics_module.__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _load_cache(path, header):
+    """
+    Return the cached runs of a cache file, or none if it is missing or was computed differently.
+    """
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache["runs"] if cache.get("header") == header else {}
+
+def _save_cache(path, header, runs):
+    """
+    Write a cache file, replacing it atomically.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.partial"
+    with open(partial, "w") as f:
+        json.dump({"header": header, "runs": runs}, f)
+    os.replace(partial, path)
+
+def cached_metrics(controller, sim_type, res_path=None, cache_dir="simulation_results/metrics_cache",
+                   output_var='temperatureSensor_T', target=20.0, disturbance_src='windowState', metrics=None,
+                   name=None, jobs=1):
+    """
+    Compute the metrics of every run of a controller and scenario, reusing the values cached for runs
+    whose result file did not change since they were computed with the same metric code. Only new or
+    changed runs are read. The cache is updated and forgets runs that no longer exist.
+
+    Args:
+        controller (str): The controller name.
+        sim_type (str): The scenario name.
+        res_path (str): The raw results folder. Default is looked up as in `load_data`.
+        cache_dir (str): The folder of the cache files, one per controller and scenario.
+        output_var (str): The controlled variable.
+        target (float): The setpoint.
+        disturbance_src (str): The column whose state 2 marks a disturbance.
+        metrics (List): Metric names or functions. Default computes every metric.
+        name (str): The value of the controller column, e.g. 'results_pid_nominal'.
+        jobs (int): Worker processes computing the metrics of the new runs.
+
+    Returns:
+        pd.DataFrame: The metrics of all runs, as returned by `compute_metrics` on `load_data`.
+    """
+    names = [getattr(metric, '__name__', metric) for metric in (metrics or METRIC_KERNELS)]
+    header = {"version": metrics_version(), "output_var": output_var, "target": target,
+              "disturbance_src": disturbance_src}
+    path = os.path.join(cache_dir, sim_type, f"{controller}.json")
+    cached = _load_cache(path, header)
+
+    sim_paths = run_folders(controller, sim_type, res_path)
+    runs = {}
+    stale = []
+    for sim_path in sim_paths:
+        run_name = os.path.basename(sim_path)
+        entry = cached.get(run_name)
+        if entry is not None and entry["fingerprint"] == fingerprint(sim_path) and set(names) <= set(entry["values"]):
+            runs[run_name] = entry
+        else:
+            stale.append(sim_path)
+
+    if stale:
+        columns = ['time', output_var, 'heatSourcePower', disturbance_src]
+        frames = [read_results(find_results(sim_path), columns) for sim_path in stale]
+        computed = compute_metrics(frames, output_var, target, disturbance_src, names, jobs=jobs)
+        # The table is ordered by metric then run
+        values = computed['value'].to_numpy().reshape(len(names), len(stale))
+        for i, sim_path in enumerate(stale):
+            runs[os.path.basename(sim_path)] = {"fingerprint": fingerprint(sim_path),
+                                                "values": dict(zip(names, values[:, i].tolist()))}
+    if stale or len(runs) != len(cached):
+        _save_cache(path, header, runs)
+
+    # Runs are numbered in load order, as by `compute_metrics` on `load_data`
+    order = [os.path.basename(sim_path) for sim_path in sim_paths]
+    return pd.DataFrame({
+        'controller': name,
+        'run': [i for _ in names for i in range(len(order))],
+        'metric': [metric for metric in names for _ in order],
+        'value': [runs[run_name]["values"][metric] for metric in names for run_name in order]
+    })
@@ -0,0 +1,226 @@
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+from src.data_loader import load_data
+from src.metrics import compute_metrics, METRIC_KERNELS
+from src.metrics_cache import cached_metrics
+
+# Result sets exported by the script, as (controller, scenario folder, result name suffix)
+CONTROLLERS = ["pid", "onoff", "fuzzy"]
+SCENARIOS = {"nominal": "nominal", "noise": "with_noise", "disturbances": "with_disturbances"}
+EVALUATION_VARS = ['time', 'temperatureSensor_T', 'heatSourcePower', 'windowState']
+INTERVAL_METHODS = ('normal', 'percentile', 'bca')
+# Resample counts held in memory at once, as resamples x runs
+MAX_RESAMPLE_ELEMENTS = 2 ** 22
+
+def bootstrap_means(values, n_resamples=1000, rng=None, chunk_size=None):
+    """
+    Draw bootstrap resamples of the runs and return the mean of every row of values in each of them.
+    All rows share the same resamples, whose indices are drawn as (resamples x runs) blocks.
+
+    Args:
+        values (np.ndarray): A (rows x runs) array without NaN, e.g. one row per metric.
+        n_resamples (int): The number of resamples. Default is 1000.
+        rng (np.random.Generator): The generator the resample indices are drawn from. Default is seeded with 0.
+        chunk_size (int): Resamples drawn at once. Default keeps MAX_RESAMPLE_ELEMENTS indices in memory.
+            The result does not depend on it.
+
+    Returns:
+        np.ndarray: The (rows x resamples) bootstrap means.
+    """
+    if rng is None:
+        rng = np.random.default_rng(0)
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    n = values.shape[1]
+    if chunk_size is None:
+        chunk_size = max(1, MAX_RESAMPLE_ELEMENTS // n)
+
+    means = np.empty((len(values), n_resamples))
+    for start in range(0, n_resamples, chunk_size):
+        size = min(chunk_size, n_resamples - start)
+        indices = rng.integers(0, n, size=(size, n))
+        # How often each run is drawn in each resample, so the means are one matrix product
+        offsets = (indices + n * np.arange(size)[:, None]).ravel()
+        counts = np.bincount(offsets, minlength=size * n).reshape(size, n)
+        means[:, start:start + size] = (counts @ values.T).T / n
+    return means
+
+def _bca_interval(values, means, confidence):
+    """
+    Bias-corrected and accelerated interval of the mean of each row, from its bootstrap means.
+    """
+    n = values.shape[1]
+    estimate = values.mean(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bias = stats.norm.ppf(np.mean(means < estimate[:, None], axis=1))
+        # Acceleration from the jackknife means
+        jackknife = (values.sum(axis=1, keepdims=True) - values) / (n - 1)
+        deviation = jackknife.mean(axis=1, keepdims=True) - jackknife
+        acceleration = np.sum(deviation ** 3, axis=1) / (6 * np.sum(deviation ** 2, axis=1) ** 1.5)
+        acceleration = np.nan_to_num(acceleration)
+
+        bounds = []
+        for z in stats.norm.ppf([(1 - confidence) / 2, 1 - (1 - confidence) / 2]):
+            level = stats.norm.cdf(bias + (bias + z) / (1 - acceleration * (bias + z)))
+            bounds.append(level)
+
+    lower, upper = np.empty(len(values)), np.empty(len(values))
+    for i in range(len(values)):
+        if not np.isfinite(bias[i]):
+            # Constant row: every resample gives the same mean
+            lower[i] = upper[i] = estimate[i]
+        else:
+            lower[i], upper[i] = np.quantile(means[i], [bounds[0][i], bounds[1][i]])
+    return lower, upper
+
+def bootstrap_intervals(values, n_resamples=1000, confidence=0.95, method='normal', seed=0, chunk_size=None):
+    """
+    Bootstrap the mean of every row of values, e.g. the values of each metric over the runs, with
+    the same resamples for the rows that have the same number of non-NaN values.
+
+    Args:
+        values (np.ndarray): A (rows x runs) array. NaN values are left out of their row.
+        n_resamples (int): The number of resamples. Default is 1000.
+        confidence (float): The confidence level of the intervals. Default is 0.95.
+        method (str): The interval of the mean: 'normal' (mean of the bootstrap means +- z times their
+            standard deviation), 'percentile' or 'bca'. Default is 'normal'.
+        seed (int): Seed of the generator the resamples are drawn from. Default is 0.
+        chunk_size (int): Resamples drawn at once, see `bootstrap_means`.
+
+    Returns:
+        pd.DataFrame: Per row, the bootstrap mean and its interval (mean, mean_ci_lower, mean_ci_upper),
+        and the variance of the bootstrap means with the normal interval of the mean using their ddof=1
+        standard deviation (var, var_ci_lower, var_ci_upper). Rows with fewer than two values are NaN.
+
+    Raises:
+        ValueError: If the method is unknown.
+    """
+    if method not in INTERVAL_METHODS:
+        raise ValueError(f"Unknown interval method '{method}', expected one of {INTERVAL_METHODS}")
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    columns = ['mean', 'mean_ci_lower', 'mean_ci_upper', 'var', 'var_ci_lower', 'var_ci_upper']
+    result = np.full((len(values), len(columns)), np.nan)
+    z = stats.norm.ppf(1 - (1 - confidence) / 2)
+    rng = np.random.default_rng(seed)
+
+    valid = ~np.isnan(values)
+    counts = valid.sum(axis=1)
+    for n in np.unique(counts):
+        if n <= 1:
+            continue
+        rows = np.flatnonzero(counts == n)
+        # Rows with n values are compacted to (rows x n) and resampled together
+        group = values[rows][valid[rows]].reshape(len(rows), n)
+        means = bootstrap_means(group, n_resamples, rng, chunk_size)
+
+        mean = means.mean(axis=1)
+        std_error = means.std(axis=1, ddof=1)
+        if method == 'normal':
+            spread = z * means.std(axis=1)
+            lower, upper = mean - spread, mean + spread
+        elif method == 'percentile':
+            lower, upper = np.quantile(means, [(1 - confidence) / 2, 1 - (1 - confidence) / 2], axis=1)
+        else:
+            lower, upper = _bca_interval(group, means, confidence)
+        result[rows] = np.column_stack([mean, lower, upper, means.var(axis=1, ddof=1),
+                                        mean - z * std_error, mean + z * std_error])
+    return pd.DataFrame(result, columns=columns)
+
+def aggregate_metrics(metric_values, **kwargs):
+    """
+    Bootstrap the mean of each metric of a long table as returned by `compute_metrics`.
+
+    Args:
+        metric_values (pd.DataFrame): One row per metric and run, with metric, run and value columns.
+        **kwargs: Passed to `bootstrap_intervals`.
+
+    Returns:
+        pd.DataFrame: One row per metric, in the order of the table, as in `statistics/*_aggregated.csv`.
+    """
+    names = pd.unique(metric_values['metric'])
+    table = metric_values.pivot(index='metric', columns='run', values='value').reindex(names)
+    aggregated = bootstrap_intervals(table.to_numpy(dtype=np.float64), **kwargs)
+    aggregated.insert(0, 'metric', names)
+    return aggregated
+
+def export_stats(long_format_df, scenario_name, output_dir="simulation_results/statistics", **kwargs):
+    """
+    Export the metrics of every run of a result set with their bootstrap statistics.
+
+    Writes `<scenario_name>_all.csv`, one row per metric and run, and `<scenario_name>_aggregated.csv`,
+    one row per metric.
+
+    Args:
+        long_format_df (pd.DataFrame): The metrics, as returned by `compute_metrics`.
+        scenario_name (str): The result set name, e.g. 'results_pid_nominal'.
+        output_dir (str): The statistics folder.
+        **kwargs: Passed to `bootstrap_intervals`.
+
+    Returns:
+        pd.DataFrame: The aggregated table.
+    """
+    aggregated_stats = aggregate_metrics(long_format_df, **kwargs)
+
+    os.makedirs(output_dir, exist_ok=True)
+    aggregated_stats.to_csv(os.path.join(output_dir, f"{scenario_name}_aggregated.csv"), index=False)
+    long_format_df.to_csv(os.path.join(output_dir, f"{scenario_name}_all.csv"), index=False)
+    return aggregated_stats
+
+def calculate_and_export_stats(scenario_results, metrics, scenario_name, output_dir="simulation_results/statistics",
+                               jobs=1, **kwargs):
+    """
+    Compute the metrics of every run of a result set and export them with their bootstrap statistics,
+    see `export_stats`.
+
+    Args:
+        scenario_results: The runs, as accepted by `compute_metrics`.
+        metrics (List): Metric functions or names.
+        scenario_name (str): The result set name, e.g. 'results_pid_nominal'.
+        output_dir (str): The statistics folder.
+        jobs (int): Worker processes computing the metrics.
+        **kwargs: Passed to `bootstrap_intervals`.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: The aggregated and the per-run tables.
+    """
+    long_format_df = compute_metrics(scenario_results, 'temperatureSensor_T', 20.0, 'windowState', metrics,
+                                     controller=scenario_name, jobs=jobs)
+    return export_stats(long_format_df, scenario_name, output_dir, **kwargs), long_format_df
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute the metrics of every result set and export their statistics.")
+    parser.add_argument("--controllers", nargs="+", choices=CONTROLLERS, default=CONTROLLERS)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--res_path", default=None, help="Raw results folder. Default is looked up as in load_data.")
+    parser.add_argument("--output_dir", default="simulation_results/statistics", help="Statistics folder.")
+    parser.add_argument("--resamples", type=int, default=1000, help="Number of bootstrap resamples.")
+    parser.add_argument("--confidence", type=float, default=0.95, help="Confidence level of the intervals.")
+    parser.add_argument("--method", choices=INTERVAL_METHODS, default="normal", help="Interval of the mean.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the bootstrap resamples.")
+    parser.add_argument("--jobs", type=int, default=1, help="Worker processes computing the metrics.")
+    parser.add_argument("--metrics_cache", default="simulation_results/metrics_cache",
+                        help="Folder of the per-run metrics cache. Only new or changed runs are computed.")
+    parser.add_argument("--no_metrics_cache", action="store_true",
+                        help="Compute the metrics of every run, without reading or updating the cache.")
+    args = parser.parse_args()
+    bootstrap = dict(n_resamples=args.resamples, confidence=args.confidence, method=args.method, seed=args.seed)
+
+    for controller in args.controllers:
+        for scenario in args.scenarios:
+            start = time.perf_counter()
+            name = f"results_{controller}_{SCENARIOS[scenario]}"
+            if args.no_metrics_cache:
+                results = load_data(controller, scenario, args.res_path, columns=EVALUATION_VARS)
+                calculate_and_export_stats(results, list(METRIC_KERNELS), name, args.output_dir, args.jobs,
+                                           **bootstrap)
+            else:
+                long_format_df = cached_metrics(controller, scenario, args.res_path, args.metrics_cache,
+                                                name=name, jobs=args.jobs)
+                export_stats(long_format_df, name, args.output_dir, **bootstrap)
+            print(f"Stats for {name} calculated and exported in {time.perf_counter() - start:.2f} s.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The evaluation modules are imported as `src.*` from the evaluation folder, as in the notebooks
+EVALUATION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if EVALUATION_DIR not in sys.path:
+    sys.path.insert(0, EVALUATION_DIR)
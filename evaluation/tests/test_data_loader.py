@@ -0,0 +1,15 @@
+import pytest
+from src.data_loader import find_results
+
+
+def test_find_results(tmp_path):
+    assert find_results(str(tmp_path)) is None
+    (tmp_path / "simulation_results.csv").write_text("time\n0.0\n")
+    assert find_results(str(tmp_path)) == str(tmp_path / "simulation_results.csv")
+
+
+def test_find_results_rejects_several_formats(tmp_path):
+    (tmp_path / "simulation_results.csv").write_text("time\n0.0\n")
+    (tmp_path / "simulation_results.npz").write_bytes(b"")
+    with pytest.raises(ValueError, match="several result files"):
+        find_results(str(tmp_path))
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from src import ensemble_store
+from src.ensemble_store import EnsembleStore
+
+
+def write_runs(tmp_path, lengths):
+    sim_paths = []
+    for i, length in enumerate(lengths):
+        sim_path = tmp_path / f"sim_{i + 1}"
+        sim_path.mkdir()
+        pd.DataFrame({'temperatureSensor.T': 291.15 + np.arange(length) + i, 'time': 0.5 * np.arange(length)}) \
+            .to_csv(sim_path / "simulation_results.csv", index=False)
+        sim_paths.append(str(sim_path))
+    return sim_paths
+
+
+def test_build_reads_every_run_once(tmp_path, monkeypatch):
+    sim_paths = write_runs(tmp_path, [4, 6, 5])
+    reads = []
+    read_results = ensemble_store.read_results
+
+    def counted_read(path, columns=None):
+        reads.append(path)
+        return read_results(path, columns)
+
+    monkeypatch.setattr(ensemble_store, "read_results", counted_read)
+
+    store = EnsembleStore.build(sim_paths, str(tmp_path / "store"))
+    assert len(reads) == len(sim_paths)
+    assert store.columns == ['temperatureSensor_T', 'time']
+    assert list(store.lengths) == [4, 6, 5]
+    assert store.steps == 6
+    assert sorted(path.name for path in (tmp_path / "store").iterdir()) == \
+        ['index.json', 'temperatureSensor_T.npy', 'time.npy']
+
+    for i, sim_path in enumerate(sim_paths):
+        expected = read_results(sim_path + "/simulation_results.csv")
+        pd.testing.assert_frame_equal(store.run(i), expected)
+        assert np.isnan(store.column('time')[i, store.lengths[i]:]).all()
+
+
+def test_build_selected_columns(tmp_path):
+    store = EnsembleStore.build(write_runs(tmp_path, [3, 2]), str(tmp_path / "store"), ['time'])
+    assert store.columns == ['time']
+    assert list(store.lengths) == [3, 2]
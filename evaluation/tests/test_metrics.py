@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+import reference_metrics
+from src import metrics
+from src.metrics import compute_metrics, METRIC_KERNELS
+
+OUTPUT = 'temperatureSensor_T'
+TARGET = 20.0
+
+
+def run(output, window=None, step=0.5, seed=0):
+    """
+    A run with the given output and window state, and random heating power.
+    """
+    output = np.asarray(output, dtype=np.float64)
+    n = len(output)
+    return pd.DataFrame({
+        'time': np.arange(n) * step,
+        OUTPUT: output,
+        'heatSourcePower': np.random.default_rng(seed).uniform(0, 2000, n),
+        'windowState': np.full(n, 2.0) if window is None else np.asarray(window, dtype=np.float64)
+    })
+
+
+def approach(n=400, start=15.0, tau=60.0, noise=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n) * 0.5
+    return TARGET + (start - TARGET) * np.exp(-t / tau) + rng.normal(0, noise, n)
+
+
+def windows(n, spans):
+    """
+    A window state that is closed (2) except for the given (first, end, state) spans.
+    """
+    state = np.full(n, 2.0)
+    for first, end, value in spans:
+        state[first:end] = value
+    return state
+
+
+def with_nan(values, indices):
+    values = values.copy()
+    values[indices] = np.nan
+    return values
+
+
+CASES = {
+    'settling': run(approach()),
+    'overshooting': run(approach(start=25.0, noise=0.3, seed=1)),
+    'never_settles': run(approach(start=10.0, tau=1e4)),
+    'leaves_band_at_end': run(np.append(approach(), 30.0)),
+    'nan_samples': run(with_nan(approach(seed=2), [5, 150, 300])),
+    'nan_last_sample': run(with_nan(approach(seed=3), [-1])),
+    'flat_at_target': run(np.full(200, TARGET)),
+    'flat_below_target': run(np.full(200, 18.0)),
+    'single_row': run([19.9]),
+    'two_rows': run([19.9, 20.1]),
+    'recovery_windows': run(approach(seed=4), windows(400, [(50, 80, 0), (200, 260, 1)])),
+    'unrecovered_windows': run(np.full(400, 15.0), windows(400, [(10, 20, 0), (100, 120, 1), (390, 400, 0)])),
+    'back_to_back_windows': run(approach(seed=5), windows(400, [(30, 31, 0), (31, 32, 2), (32, 40, 1)])),
+    'window_open_at_start': run(approach(seed=6), windows(400, [(0, 25, 0)])),
+}
+
+
+def same(expected, actual):
+    if np.isnan(expected):
+        return np.isnan(actual)
+    return actual == pytest.approx(expected, rel=1e-12, abs=1e-12)
+
+
+@pytest.mark.parametrize("name", METRIC_KERNELS)
+@pytest.mark.parametrize("case", CASES)
+def test_metric_matches_reference(case, name):
+    data = CASES[case]
+    expected = getattr(reference_metrics, name)(data, OUTPUT, TARGET, 'windowState')
+    actual = getattr(metrics, name)(data, OUTPUT, TARGET, 'windowState')
+    assert same(expected, actual), f"{name} on {case}: expected {expected}, got {actual}"
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_batch_matches_reference(jobs):
+    frames = list(CASES.values())
+    table = compute_metrics(frames, OUTPUT, TARGET, 'windowState', controller='test', jobs=jobs)
+    assert list(table['metric']) == [name for name in METRIC_KERNELS for _ in frames]
+    for metric, run_index, value in zip(table['metric'], table['run'], table['value']):
+        expected = getattr(reference_metrics, metric)(frames[run_index], OUTPUT, TARGET, 'windowState')
+        assert same(expected, value), f"{metric} on run {run_index}: expected {expected}, got {value}"
@@ -4,9 +4,16 @@ class BaseController:
     def update(self, control_inputs: dict[str, float], time: float, step_size: float) -> dict[str, float]:
         pass
 
+    def update_batch(self, states: dict[str, np.ndarray], step_size: float) -> dict[str, np.ndarray]:
+        """
+        Update the controller for all members of an ensemble at once.
 
+        Args:
+            states (dict[str, np.ndarray]): The values of each model variable, one entry per member.
+            step_size (float): The simulation step size.
 
+        Returns:
+            dict[str, np.ndarray]: The output values, one entry per member.
+        """
 
-
-    
-
+        raise NotImplementedError(f"{type(self).__name__} does not support batched updates")
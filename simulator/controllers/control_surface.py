@@ -0,0 +1,187 @@
+import hashlib
+import itertools
+import json
+import logging
+import os
+import tempfile
+from bisect import bisect_right
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Directory where tabulated surfaces are stored, keyed by a hash of the controller configuration
+SURFACE_CACHE = os.environ.get("FUZZY_SURFACE_CACHE", os.path.join(tempfile.gettempdir(), "fuzzy_surface"))
+
+# Surfaces already loaded in this process
+_surfaces = {}
+
+
+class ControlSurface:
+    """
+    Tabulated output of a fuzzy controller over the input ranges declared in its configuration,
+    answered with multilinear interpolation.
+
+    The two terms of the centroid are tabulated and interpolated separately, then divided, because
+    the output itself jumps to 0 where no rule fires. Inputs outside the declared ranges are clamped
+    to the nearest edge of the grid.
+
+    Attributes:
+        axes (List[np.ndarray]): The grid points of each input, in the order of the controller inputs.
+        weighted (np.ndarray): The centroid numerator at every grid node.
+        total (np.ndarray): The centroid denominator at every grid node.
+        max_error (float): The largest absolute difference between interpolation and exact inference
+                           over the check points drawn when the surface was built.
+    """
+
+    def __init__(self, axes, weighted, total, max_error=None):
+        self.axes = [np.asarray(axis, dtype=np.float64) for axis in axes]
+        self.weighted = np.asarray(weighted, dtype=np.float64)
+        self.total = np.asarray(total, dtype=np.float64)
+        self.max_error = max_error
+        self._axis_lists = [axis.tolist() for axis in self.axes]
+        self._corners = list(itertools.product((0, 1), repeat=len(self.axes)))
+
+    @staticmethod
+    def default_axes(controller, points_per_segment=8):
+        """
+        Grid that contains every membership function breakpoint inside the input ranges,
+        with points_per_segment intervals between consecutive breakpoints.
+        """
+
+        axes = []
+        for var in controller.inputs:
+            low, high = controller.config["inputs"][var]["range"]
+            breakpoints = {low, high}
+            for points in controller.input_mfs[var].values():
+                breakpoints.update(p for p in points if low <= p <= high)
+            breakpoints = sorted(breakpoints)
+            segments = [np.linspace(a, b, points_per_segment + 1)[:-1] for a, b in zip(breakpoints, breakpoints[1:])]
+            axes.append(np.append(np.concatenate(segments), high))
+        return axes
+
+    @staticmethod
+    def resolve_axes(controller, grid=None):
+        """
+        Turn a grid specification into one array of points per input.
+
+        Args:
+            grid: None for the default breakpoint-refined grid, an int for that many evenly spaced
+                  points per input, or a dict mapping input names to a point count or explicit points.
+        """
+
+        if grid is None:
+            return ControlSurface.default_axes(controller)
+        axes = []
+        for var in controller.inputs:
+            spec = grid.get(var) if isinstance(grid, dict) else grid
+            low, high = controller.config["inputs"][var]["range"]
+            if spec is None:
+                raise ValueError(f"No grid given for input '{var}'")
+            axes.append(np.linspace(low, high, spec) if np.isscalar(spec) else np.sort(np.asarray(spec, dtype=np.float64)))
+        return axes
+
+    @classmethod
+    def build(cls, controller, axes, n_checks=5000, seed=0):
+        """
+        Tabulate the controller on a grid and measure the interpolation error at random points.
+
+        Check points are drawn in uniformly chosen grid cells rather than uniformly over the ranges,
+        so the finely gridded regions around narrow membership functions are checked as well.
+
+        Args:
+            controller (FuzzyLogicController): The controller to tabulate.
+            axes (List[np.ndarray]): The grid points of each input.
+            n_checks (int): Number of random points compared against exact inference.
+            seed (int): Seed of the check points.
+        """
+
+        shape = [len(axis) for axis in axes]
+        nodes = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, len(axes))
+        weighted, total = controller.centroid_terms(nodes)
+        surface = cls(axes, weighted.reshape(shape), total.reshape(shape))
+
+        rng = np.random.default_rng(seed)
+        checks = []
+        for axis in surface.axes:
+            cells = rng.integers(0, len(axis) - 1, n_checks)
+            checks.append(axis[cells] + rng.uniform(0, 1, n_checks) * (axis[cells + 1] - axis[cells]))
+        checks = np.column_stack(checks)
+        surface.max_error = float(np.max(np.abs(surface.interpolate_batch(checks) - controller.infer(checks))))
+        return surface
+
+    @classmethod
+    def load_or_build(cls, controller, grid=None):
+        """
+        Return the surface of a controller, from the process or disk cache when the same configuration
+        and grid were tabulated before.
+        """
+
+        axes = cls.resolve_axes(controller, grid)
+        digest = hashlib.sha256(json.dumps([controller.config, controller.inputs], sort_keys=True).encode())
+        for axis in axes:
+            digest.update(axis.tobytes())
+        key = digest.hexdigest()
+        if key in _surfaces:
+            return _surfaces[key]
+
+        path = os.path.join(SURFACE_CACHE, f"{key}.npz")
+        if os.path.exists(path):
+            with np.load(path) as data:
+                surface = cls([data[f"axis_{i}"] for i in range(len(axes))], data["weighted"], data["total"],
+                              float(data["max_error"]))
+        else:
+            surface = cls.build(controller, axes)
+            os.makedirs(SURFACE_CACHE, exist_ok=True)
+            partial = f"{path}.{os.getpid()}.npz"
+            np.savez(partial, weighted=surface.weighted, total=surface.total, max_error=surface.max_error,
+                     **{f"axis_{i}": axis for i, axis in enumerate(surface.axes)})
+            os.replace(partial, path)
+        logger.info("Fuzzy control surface %s: %d points, max interpolation error %.4g",
+                    key[:12], surface.total.size, surface.max_error)
+        _surfaces[key] = surface
+        return surface
+
+    def interpolate(self, point):
+        """
+        Interpolate the output at a single input vector.
+        """
+
+        cells, weights = [], []
+        for axis, x in zip(self._axis_lists, point):
+            x = min(max(x, axis[0]), axis[-1])
+            i = min(bisect_right(axis, x) - 1, len(axis) - 2)
+            cells.append(i)
+            weights.append((x - axis[i]) / (axis[i + 1] - axis[i]))
+
+        weighted = total = 0.0
+        for corner in self._corners:
+            weight = 1.0
+            for w, upper in zip(weights, corner):
+                weight *= w if upper else 1.0 - w
+            node = tuple(i + upper for i, upper in zip(cells, corner))
+            weighted += weight * self.weighted[node]
+            total += weight * self.total[node]
+        return weighted / total if total > 0 else 0.0
+
+    def interpolate_batch(self, points):
+        """
+        Interpolate the output at every row of an (N x inputs) array.
+        """
+
+        points = np.asarray(points, dtype=np.float64)
+        cells, weights = [], []
+        for d, axis in enumerate(self.axes):
+            x = np.clip(points[:, d], axis[0], axis[-1])
+            i = np.minimum(np.searchsorted(axis, x, side='right') - 1, len(axis) - 2)
+            cells.append(i)
+            weights.append((x - axis[i]) / (axis[i + 1] - axis[i]))
+
+        weighted, total = np.zeros(len(points)), np.zeros(len(points))
+        for corner in self._corners:
+            weight = np.ones(len(points))
+            for w, upper in zip(weights, corner):
+                weight *= w if upper else 1.0 - w
+            node = tuple(i + upper for i, upper in zip(cells, corner))
+            weighted += weight * self.weighted[node]
+            total += weight * self.total[node]
+        return np.divide(weighted, total, out=np.zeros_like(total), where=total > 0)
@@ -1,8 +1,19 @@
 from controllers.base_controller import BaseController
+from controllers.control_surface import ControlSurface
 import numpy as np
 
 class FuzzyLogicController(BaseController):
-    def __init__(self, config: dict, target_var, inputs: list, setpoint: float):
+    def __init__(self, config: dict, target_var, inputs: list, setpoint: float, lookup: bool = False, grid=None):
+        """
+        Args:
+            config (dict): Membership functions of the inputs and output, and the rules.
+            target_var (str): The variable to control.
+            inputs (list): The input variable names, "error" being computed from the setpoint.
+            setpoint (float): The target value of target_var.
+            lookup (bool): Answer updates by interpolating a precomputed control surface instead of
+                           running the inference. Default is False.
+            grid: Grid of the control surface, see `ControlSurface.resolve_axes`. Default is None.
+        """
         self.config = config
         self.target_var = target_var  # The variable to control (e.g. "temperatureSensor.T")
         self.setpoint = setpoint
@@ -24,6 +35,66 @@ class FuzzyLogicController(BaseController):
         self.output_mfs = config["output"][self.output_name]["membership_functions"]
         self.output_range = config["output"][self.output_name]["range"]
         self.rules = config["rules"]
+        self.compile()
+        self.surface = ControlSurface.load_or_build(self, grid) if lookup else None
+
+    def compile(self):
+        """
+        Compile the configuration into arrays, so that an update is a few vectorized operations.
+
+        Every input membership function becomes a row of trapezoid breakpoints (a triangle a, b, c
+        being the trapezoid a, b, b, c), rules become a matrix of indices into the flat vector of
+        input degrees, and the output membership functions are sampled once on the defuzzification grid.
+        """
+
+        # Input membership functions, one breakpoint row per (variable, label)
+        self.mf_slices = {}
+        self.mf_index = {}
+        breakpoints = []
+        for var in self.inputs:
+            mfs = self.input_mfs[var]
+            self.mf_slices[var] = slice(len(breakpoints), len(breakpoints) + len(mfs))
+            for label, points in mfs.items():
+                self.mf_index[(var, label)] = len(breakpoints)
+                points = sorted(points)
+                if len(points) == 3:
+                    points = [points[0], points[1], points[1], points[2]]
+                elif len(points) != 4:
+                    raise ValueError("Invalid membership function definition.")
+                breakpoints.append(points)
+        self.mf_points = np.array(breakpoints, dtype=np.float64).reshape(-1, 4)
+        a, b, c, d = self.mf_points.T
+        # Degenerate shapes have zero membership everywhere
+        self.mf_valid = (a != b) & (c != d)
+        self.mf_rise = np.where(a != b, b - a, 1.0)
+        self.mf_fall = np.where(c != d, d - c, 1.0)
+
+        # Rule antecedents as indices into the input degrees, extended with a constant 0 for labels
+        # that do not exist and a constant 1 that pads rules with fewer conditions
+        n_mfs = len(self.mf_points)
+        zero, one = n_mfs, n_mfs + 1
+        width = max((len(rule["if"]) for rule in self.rules), default=0)
+        self.rule_antecedents = np.full((len(self.rules), width), one, dtype=np.intp)
+        for i, rule in enumerate(self.rules):
+            for j, (var, label) in enumerate(rule["if"].items()):
+                if var not in self.mf_slices:
+                    raise KeyError(var)
+                self.rule_antecedents[i, j] = self.mf_index.get((var, label), zero)
+
+        # Output labels and the rules concluding each of them
+        self.output_labels = list(self.output_mfs)
+        label_position = {label: i for i, label in enumerate(self.output_labels)}
+        self.rule_outputs = np.zeros((len(self.output_labels), len(self.rules)), dtype=bool)
+        for i, rule in enumerate(self.rules):
+            self.rule_outputs[label_position[list(rule["then"].values())[0]], i] = True
+
+        # Output membership functions sampled on the defuzzification grid
+        resolution = 100
+        self.output_values = np.linspace(*self.output_range, resolution)
+        self.output_samples = np.array([
+            [self.membership_degree(v, self.output_mfs[label]) for v in self.output_values]
+            for label in self.output_labels
+        ]).reshape(len(self.output_labels), resolution)
 
     def membership_degree(self, x, points):
         """
@@ -73,65 +144,127 @@ class FuzzyLogicController(BaseController):
         Uses the centroid method.
         """
 
-        resolution = 100
-        output_values = np.linspace(*self.output_range, resolution)
-        aggregated = np.zeros_like(output_values)
+        activation = np.array([output_degrees.get(label, 0) for label in self.output_labels], dtype=np.float64)
+        return self.__centroid(activation[None, :])[0]
 
-        for label, degree in output_degrees.items():
-            mf_points = self.output_mfs[label]
-            mf_values = np.array([self.membership_degree(v, mf_points) for v in output_values])
-           # print(f"  MF '{label}': max degree {degree}, MF values: {mf_values}")
+    def __centroid(self, activation):
+        """
+        Centroid of the output membership functions, each clipped at its activation degree.
+        Activation is an (N x labels) array and one output value is returned per row.
+        """
 
-            aggregated = np.maximum(aggregated, np.minimum(degree, mf_values))
-            #print(f"Aggregated for label '{label}': {aggregated}")
-        total = np.sum(aggregated)
-        return np.sum(output_values * aggregated) / total if total != 0 else 0
+        return self.__divide(*self.__centroid_terms(activation))
 
-    def update(self, model_variables, step_size):
+    def __centroid_terms(self, activation):
         """
-        Update the controller based on the current model variables.
-        Returns a dictionary with the output variable name and its computed value.
+        Numerator and denominator of the centroid, for an (N x labels) activation array.
         """
 
-        # Build current input values, computing error from setpoint
-        input_values = {}
-        for var in self.inputs:
-            if var == "error":
-                input_values["error"] = self.setpoint - model_variables[self.target_var]
-                #print(f"Calculated error: {input_values['error']} (setpoint: {self.setpoint}, target: {model_variables[self.target_var]})")
-            else:
-                input_values[var] = model_variables[var]
+        aggregated = np.max(np.minimum(activation[:, :, None], self.output_samples), axis=1, initial=0.0)
+        return np.sum(self.output_values * aggregated, axis=1), np.sum(aggregated, axis=1)
 
-        # Fuzzify all input values
-        fuzzified_inputs = {
-            var: self.fuzzify(value, self.input_mfs[var])
-            for var, value in input_values.items()
-        }
+    @staticmethod
+    def __divide(weighted, total):
+        return np.divide(weighted, total, out=np.zeros_like(total), where=total != 0)
 
-        #print("Fuzzified inputs:")
-        #for var, degrees in fuzzified_inputs.items():
-        #    print(f"  {var}: {degrees}")
+    def __fuzzify_all(self, input_values):
+        """
+        Membership degrees of all input membership functions for an (N x inputs) array,
+        as an (N x membership functions) array ordered as `mf_points`.
+        """
 
+        x = np.repeat(input_values, [self.mf_slices[var].stop - self.mf_slices[var].start for var in self.inputs],
+                      axis=1)
+        a, b, c, d = self.mf_points.T
+        degrees = np.where((a <= x) & (x < b), (x - a) / self.mf_rise,
+                  np.where((b <= x) & (x <= c), 1.0,
+                  np.where((c < x) & (x <= d), (d - x) / self.mf_fall, 0.0)))
+        return np.where(self.mf_valid, degrees, 0.0)
 
-        # Apply rules
-        output_activation = {}
-        for rule in self.rules:
-            rule_if = rule["if"]
-            rule_then = rule["then"]
-            rule_strengths = []
+    def infer(self, input_values, chunk_size=4096):
+        """
+        Run the fuzzy inference for a batch of input vectors.
 
-            for var in rule_if:
-                label = rule_if[var]
-                rule_strengths.append(fuzzified_inputs[var].get(label, 0))
+        Args:
+            input_values (array-like): An (N x inputs) array with the values of `inputs` in order,
+                                       the error being already computed from the setpoint.
+            chunk_size (int): Number of input vectors processed at once, to bound memory use.
 
-            # Take the minimum strength across all conditions (AND logic)
-            rule_strength = min(rule_strengths)
-            #print(f"Rule triggered: {rule_if} → {rule_then}, strength: {rule_strength}")
-            output_label = list(rule_then.values())[0]
-            output_activation[output_label] = max(output_activation.get(output_label, 0), rule_strength)
-        
-        #print("Output activation:", output_activation)
+        Returns:
+            np.ndarray: The N output values.
+        """
 
+        return self.__divide(*self.centroid_terms(input_values, chunk_size))
 
-        output_value = self.defuzzify(output_activation)
+    def centroid_terms(self, input_values, chunk_size=4096):
+        """
+        Run the fuzzy inference for a batch of input vectors, stopping before the final division
+        of the centroid.
+
+        The output drops to 0 where no rule fires but stays at the centroid of the clipped output
+        functions for any positive activation, so the output is discontinuous while both terms of
+        the centroid are continuous. `ControlSurface` interpolates the terms for that reason.
+
+        Args:
+            input_values (array-like): An (N x inputs) array, as for `infer`.
+            chunk_size (int): Number of input vectors processed at once, to bound memory use.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The N weighted sums and the N total degrees of the
+                                           aggregated output.
+        """
+
+        input_values = np.atleast_2d(np.asarray(input_values, dtype=np.float64))
+        weighted, total = np.empty(len(input_values)), np.empty(len(input_values))
+        for start in range(0, len(input_values), chunk_size):
+            chunk = input_values[start:start + chunk_size]
+
+            # Fuzzify all input values, adding the constant 0 and 1 degrees used by the rules
+            degrees = np.ones((len(chunk), len(self.mf_points) + 2))
+            degrees[:, :-2] = self.__fuzzify_all(chunk)
+            degrees[:, -2] = 0.0
+
+            # Apply rules: minimum strength across all conditions (AND logic),
+            # then the strongest rule for each output label
+            rule_strengths = degrees[:, self.rule_antecedents].min(axis=2)
+            output_activation = np.max(np.where(self.rule_outputs, rule_strengths[:, None, :], 0.0),
+                                       axis=2, initial=0.0)
+
+            weighted[start:start + chunk_size], total[start:start + chunk_size] = \
+                self.__centroid_terms(output_activation)
+        return weighted, total
+
+    def input_vector(self, model_variables):
+        """
+        Build the input values in the order of `inputs`, computing the error from the setpoint.
+        """
+
+        return [
+            self.setpoint - model_variables[self.target_var] if var == "error" else model_variables[var]
+            for var in self.inputs
+        ]
+
+    def update(self, model_variables, step_size):
+        """
+        Update the controller based on the current model variables.
+        Returns a dictionary with the output variable name and its computed value.
+        """
+
+        input_values = self.input_vector(model_variables)
+        if self.surface is not None:
+            output_value = self.surface.interpolate(input_values)
+        else:
+            output_value = self.infer([input_values])[0]
         return {self.output_name: float(output_value)}
+
+    def update_batch(self, states, step_size):
+        """
+        Update the controller for all members of an ensemble at once, with one batched inference.
+        """
+
+        input_values = np.column_stack(self.input_vector(states))
+        if self.surface is not None:
+            output_values = self.surface.interpolate_batch(input_values)
+        else:
+            output_values = self.infer(input_values)
+        return {self.output_name: output_values}
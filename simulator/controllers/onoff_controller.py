@@ -1,4 +1,5 @@
 from controllers.base_controller import BaseController
+import numpy as np
 
 
 class OnOffController(BaseController):
@@ -21,4 +22,16 @@ class OnOffController(BaseController):
         else:
             output = self.off_value  # No change
 
-        return {self.control_output: output} if output is not None else {}
\ No newline at end of file
+        return {self.control_output: output} if output is not None else {}
+
+    def update_batch(self, states, step_size):
+        """
+        Update the controller for all members of an ensemble at once.
+        """
+
+        if self.control_input not in states:
+            raise ValueError(f"Control input variable '{self.control_input}' not found in model variables.")
+        measurement = states[self.control_input]
+        output = np.where(measurement < self.setpoint - self.threshold, self.on_value, self.off_value)
+
+        return {self.control_output: output}
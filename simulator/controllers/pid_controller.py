@@ -1,4 +1,11 @@
+import logging
 from controllers.base_controller import BaseController
+from simulation_engine.profiling import RateLimitFilter
+import numpy as np
+
+logger = logging.getLogger(__name__)
+# Updates run at every step, so their debug output is rate limited
+logger.addFilter(RateLimitFilter())
 
 class PIDController(BaseController):
     def __init__(self, control_input, control_output, Kp, Ki, Kd, setpoint, max_output):
@@ -10,13 +17,16 @@ class PIDController(BaseController):
         self.setpoint = setpoint
         self.integral = 0
         self.prev_error = 0
+        # Per-member state of batched updates, kept apart from the scalar state of `update`
+        self.batch_integral = None
+        self.batch_prev_error = None
         self.max_output = max_output
         if max_output <= 0:
             raise ValueError("max_output must be a positive value")
 
     def update(self, model_variables, step_size):
         measurement = model_variables[self.control_input]
-        print(f"PIDController: measurement={measurement}, setpoint={self.setpoint}, step_size={step_size}")
+        logger.debug("PIDController: measurement=%s, setpoint=%s, step_size=%s", measurement, self.setpoint, step_size)
         error = self.setpoint - measurement
         self.integral += error * step_size
         derivative = (error - self.prev_error) / step_size
@@ -27,4 +37,24 @@ class PIDController(BaseController):
             output = 0.0
         self.prev_error = error
 
-        return {self.control_output: output}
\ No newline at end of file
+        return {self.control_output: output}
+
+    def update_batch(self, states, step_size):
+        """
+        Update the controller for all members of an ensemble at once. The integral and previous
+        error of each member are kept in `batch_integral` and `batch_prev_error`, starting from the
+        scalar state, so that `update` can still be used on the same controller. The gains or
+        setpoint may be arrays too.
+        """
+
+        error = self.setpoint - states[self.control_input]
+        if self.batch_integral is None or np.shape(self.batch_integral) != np.shape(error):
+            self.batch_integral = np.full(np.shape(error), self.integral, dtype=np.float64)
+            self.batch_prev_error = np.full(np.shape(error), self.prev_error, dtype=np.float64)
+        self.batch_integral = self.batch_integral + error * step_size
+        derivative = (error - self.batch_prev_error) / step_size
+        output = self.Kp * error + self.Ki * self.batch_integral + self.Kd * derivative
+        output = np.clip(output, 0.0, self.max_output)
+        self.batch_prev_error = error
+
+        return {self.control_output: output}
@@ -7,6 +7,10 @@ from scenarios.room_heater.utils.fuzzy_config import fuzzy_config
 def generate_inputs(duration, step_size, seed=0):
     """
     Generate input variables for the room heater scenario.
+
+    The outside temperature walk draws from its own generator seeded with `seed`, and the other
+    inputs from the global stream, so the walk does not shift the window schedule. Schedules
+    generated before the walk was vectorized are not reproduced by the same seed.
     """
     
     np.random.seed(seed)    # ensures reproducibility
@@ -19,7 +23,7 @@ def generate_inputs(duration, step_size, seed=0):
     end_time = (start_time + 4) % 24  # ensures end_time is within the same day
     freq = 10  # frequency in minutes
     temperatures = simulate_temperature(day, month, start_time, end_time)
-    final_temperatures = interpolate_temperatures(temperatures, freq = freq)
+    final_temperatures = interpolate_temperatures(temperatures, freq = freq, rng = np.random.default_rng(seed))
     
     values = []
     rows = list(final_temperatures.itertuples())  # convert to list so we can look ahead
@@ -109,13 +113,22 @@ def setup_controller(controller_type):
         return OnOffController(control_input="measuredTemp", control_output="heatSourcePower",
                                setpoint=20.0, threshold=0.1,
                                on_value=1500.0, off_value=0.0)
-    elif controller_type == "fuzzy":
+    elif controller_type in ("fuzzy", "fuzzy_lookup"):
         from controllers.fuzzy_controller import FuzzyLogicController
-        return FuzzyLogicController(config=fuzzy_config, target_var= "measuredTemp", inputs = ["error","outsideTemp","roomAir.der_T"], setpoint=20.0)
+        return FuzzyLogicController(config=fuzzy_config, target_var= "measuredTemp", inputs = ["error","outsideTemp","roomAir.der_T"], setpoint=20.0,
+                                    lookup=controller_type == "fuzzy_lookup")
     else:
         raise ValueError(f"Unsupported controller type: {controller_type}")
     
 
+def setup_metrics():
+    """
+    Setup the online metrics of the room temperature, computed while the simulation runs.
+    """
+    from simulation_engine.online_metrics import create_metrics
+    return create_metrics("temperatureSensor.T", 20.0, power_var="heatSourcePower", disturbance_var="windowState")
+
+
 def get_fmu_path():
     """
     Returns the path to the FMU model.
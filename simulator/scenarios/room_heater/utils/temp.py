@@ -1,82 +1,108 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import datetime as dt
+from functools import lru_cache
 from meteostat import Hourly, Point
 import pandas as pd
+from scipy.special import ndtr, ndtri
+from . import weather_cache
+from .weather_cache import WeatherStore
+
+VANCOUVER = (49.2497, -123.1193, 70)
+weather_store = WeatherStore()
 
 
 def simulate_temperature(day, month, start_time, end_time):
 
     """
     Simulate temperature data for a given day and time range.
+    Data is served from the local weather store, behind an in-process LRU cache. On a miss the
+    whole day is fetched from meteostat and stored, unless strict offline mode is enabled.
+
+    Raises:
+        LookupError: If the day is not in the weather store and offline mode is enabled.
     """
     
-    vancouver = Point(49.2497, -123.1193, 70)
+    return _cached_temperature(day, month, start_time, end_time).copy()
+
+
+@lru_cache(maxsize=1024)
+def _cached_temperature(day, month, start_time, end_time):
+    date = dt.date(2023, month, day)
+    if not weather_store.has_days(VANCOUVER, [date]):
+        if weather_cache.OFFLINE:
+            raise LookupError(f"No weather data for {date} in {weather_store.path} (offline mode)")
+        data = Hourly(Point(*VANCOUVER), dt.datetime.combine(date, dt.time(0)),
+                      dt.datetime.combine(date, dt.time(23))).fetch()
+        weather_store.put(VANCOUVER, data[['temp']], [date])
+
     start = dt.datetime(2023, month, day, start_time)
     end = dt.datetime(2023, month, day, end_time)
-    
-    data = Hourly(vancouver, start, end)
-    data = data.fetch()
-    #print(data.columns)
-    data = data[['temp']]
-    
- 
-    #print(f"Fetched data for {day}/{month} from {start_time} to {end_time}")
-    #print(data)
-    
-    
-    return data
+    return weather_store.get(VANCOUVER, start, end)
 
 
-def interpolate_temperatures(df, col="temp", freq=10, noise_scale=0.1): 
+def interpolate_temperatures(df, col="temp", freq=10, noise_scale=0.1, rng=None): 
     
     """ 
     Enrich temperature data generating values at a specified frequency 
     by adding random noise to a linear interpolation between points.
+
+    Each segment between two hourly points is a monotone random walk from the first value to the
+    second. Every step is drawn from a normal distribution truncated to the range that keeps the
+    walk between the current value and the segment end, and the last point of each segment matches
+    its end value exactly. All segments are advanced together, one step at a time.
+
+    Args:
+        df (pd.DataFrame): Temperature data indexed by time.
+        col (str): The column to interpolate. Default is 'temp'.
+        freq (int): The output frequency in minutes. Default is 10.
+        noise_scale (float): Standard deviation of the walk steps. Default is 0.1.
+        rng (np.random.Generator): Source of randomness. Default is a freshly seeded generator.
     """
-    
-    result = []
-    times = []
-
-    for i in range(len(df) - 1):
-        t0, t1 = df.index[i], df.index[i+1]
-        v0, v1 = df.iloc[i][col], df.iloc[i+1][col]
-        
-        time_range = pd.date_range(t0, t1, freq=f"{freq}min")
-        n = len(time_range)
-
-       # Skip segment if no intermediate time points
-        if n < 2:
-            continue
-
-        # Initialize segment values
-        segment = [v0]
-        last_point = v0
-        direction = 1 if v1 >= last_point else -1
-
-        for _ in range(n - 2):  # Exclude first and last points
-
-            attempts = 0
-            while attempts < 100:  # Limit attempts to avoid infinite loop
-                attempts += 1
-                candidate = segment[-1] + np.random.normal(0, noise_scale)
-                if direction == 1 and last_point <= candidate <= v1:
-                    break
-                elif direction == -1 and v1 <= candidate <= last_point:
-                    break
-            segment.append(candidate)
-            last_point = candidate
-
-        segment.append(v1)  # Final value must match v1
-
-        result.extend(segment)
-        times.extend(time_range)
 
+    if rng is None:
+        rng = np.random.default_rng()
+
+    times = df.index.values
+    values = df[col].to_numpy(dtype=np.float64)
+    step = np.timedelta64(freq, 'm')
+
+    # Points per segment, both ends included, as produced by pd.date_range(t0, t1, freq)
+    counts = (times[1:] - times[:-1]) // step + 1
+    # Skip segment if no intermediate time points
+    keep = counts >= 2
+    start_times, counts = times[:-1][keep], counts[keep].astype(np.int64)
+    start_values, end_values = values[:-1][keep], values[1:][keep]
+
+    width = counts.max() if len(counts) else 0
+    walk = np.empty((len(counts), width))
+    if width:
+        walk[:, 0] = start_values
+    for k in range(1, width - 1):  # Exclude first and last points
+        last_point = walk[:, k - 1]
+        low = np.minimum(last_point, end_values) - last_point
+        high = np.maximum(last_point, end_values) - last_point
+        walk[:, k] = last_point + _truncated_normal(low, high, noise_scale, rng)
+    walk[np.arange(len(counts)), counts - 1] = end_values  # Final value must match v1
+
+    in_segment = np.arange(width) < counts[:, None]
+    result = np.append(walk[in_segment], values[-1])
+    segment_times = (start_times[:, None] + np.arange(width) * step)[in_segment]
     # Add last point from df
-    result.append(df.iloc[-1][col])
-    times.append(df.index[-1])
+    index = pd.DatetimeIndex(np.append(segment_times, times[-1]))
+
+    return pd.DataFrame({col: result}, index=index)
+
+
+def _truncated_normal(low, high, scale, rng):
+    """
+    Draw one sample per element from a zero-mean normal distribution truncated to [low, high],
+    by inverting the normal CDF on the uniform draw.
+    """
 
-    return pd.DataFrame({col: result}, index=times)
+    cdf_low = ndtr(low / scale)
+    cdf_high = ndtr(high / scale)
+    return scale * ndtri(cdf_low + (cdf_high - cdf_low) * rng.random(len(low)))
 
 
 # Example simulation
@@ -0,0 +1,135 @@
+import argparse
+import datetime as dt
+from contextlib import closing, contextmanager
+import os
+import sqlite3
+import pandas as pd
+from meteostat import Hourly, Point
+
+# Location of the local weather store, shared by all runs on the host
+WEATHER_CACHE = os.environ.get(
+    "WEATHER_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "simulation_project", "weather.sqlite"))
+# In strict offline mode a cache miss raises instead of querying meteostat
+OFFLINE = os.environ.get("WEATHER_OFFLINE", "0") == "1"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hourly (
+    lat REAL, lon REAL, alt REAL, time TEXT, temp REAL,
+    PRIMARY KEY (lat, lon, alt, time)
+);
+CREATE TABLE IF NOT EXISTS days (
+    lat REAL, lon REAL, alt REAL, day TEXT,
+    PRIMARY KEY (lat, lon, alt, day)
+);
+"""
+
+
+class WeatherStore:
+    """
+    Local SQLite store of hourly temperatures, filled in bulk from meteostat or from a file.
+
+    Coverage is tracked per whole day, so a query is answered locally when every day it touches has
+    been stored, even if meteostat had no observation for some of its hours.
+
+    Attributes:
+        path (str): The path to the SQLite database.
+    """
+
+    def __init__(self, path: str = WEATHER_CACHE):
+        self.path = path
+
+    @contextmanager
+    def __connect(self):
+        """
+        Open the database for one transaction, creating it if needed.
+        """
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with closing(sqlite3.connect(self.path, timeout=60)) as connection:
+            connection.executescript(SCHEMA)
+            with connection:
+                yield connection
+
+    def has_days(self, location: tuple, days: list) -> bool:
+        """
+        Return True if every given day has been stored for the location.
+        """
+
+        with self.__connect() as connection:
+            stored = connection.execute(
+                f"SELECT COUNT(*) FROM days WHERE lat=? AND lon=? AND alt=? AND day IN ({','.join('?' * len(days))})",
+                (*location, *[day.isoformat() for day in days])).fetchone()[0]
+        return stored == len(days)
+
+    def get(self, location: tuple, start: dt.datetime, end: dt.datetime) -> pd.DataFrame:
+        """
+        Return the stored hourly temperatures between start and end, both included.
+
+        Returns:
+            pd.DataFrame: A frame with a 'temp' column, indexed by time.
+        """
+
+        with self.__connect() as connection:
+            frame = pd.read_sql_query(
+                "SELECT time, temp FROM hourly WHERE lat=? AND lon=? AND alt=? AND time BETWEEN ? AND ? ORDER BY time",
+                connection, params=(*location, start.isoformat(), end.isoformat()))
+        frame['time'] = pd.to_datetime(frame['time'])
+        return frame.set_index('time')
+
+    def put(self, location: tuple, frame: pd.DataFrame, days: list):
+        """
+        Store hourly temperatures and mark the given days as covered.
+
+        Args:
+            location (tuple): Latitude, longitude and altitude of the weather point.
+            frame (pd.DataFrame): Hourly data with a 'temp' column, indexed by time.
+            days (list): The dates fully covered by the frame.
+        """
+
+        rows = [(*location, pd.Timestamp(time).to_pydatetime().isoformat(), None if pd.isna(temp) else float(temp))
+                for time, temp in frame['temp'].items()]
+        with self.__connect() as connection:
+            connection.executemany("INSERT OR REPLACE INTO hourly VALUES (?, ?, ?, ?, ?)", rows)
+            connection.executemany("INSERT OR REPLACE INTO days VALUES (?, ?, ?, ?)",
+                                   [(*location, day.isoformat()) for day in days])
+
+    def prefetch(self, location: tuple, start: dt.date, end: dt.date):
+        """
+        Fetch every hour from start to end, both days included, with a single meteostat request.
+        """
+
+        data = Hourly(Point(*location), dt.datetime.combine(start, dt.time(0)),
+                      dt.datetime.combine(end, dt.time(23))).fetch()
+        self.put(location, data[['temp']], list(pd.date_range(start, end, freq='D').date))
+
+    def import_file(self, location: tuple, path: str):
+        """
+        Import hourly temperatures from a CSV file with 'time' and 'temp' columns. Every day that
+        appears in the file is marked as covered.
+        """
+
+        frame = pd.read_csv(path, parse_dates=['time']).set_index('time')
+        self.put(location, frame[['temp']], sorted(set(frame.index.date)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the local weather store.")
+    parser.add_argument("--lat", type=float, default=49.2497, help="Latitude of the weather point.")
+    parser.add_argument("--lon", type=float, default=-123.1193, help="Longitude of the weather point.")
+    parser.add_argument("--alt", type=float, default=70, help="Altitude of the weather point.")
+    parser.add_argument("--prefetch", nargs=2, metavar=("START", "END"),
+                        help="Fetch all hours between two ISO dates, both included.")
+    parser.add_argument("--import_file", help="CSV file with 'time' and 'temp' columns to import.")
+    args = parser.parse_args()
+
+    store = WeatherStore()
+    location = (args.lat, args.lon, args.alt)
+    if args.prefetch:
+        start, end = (dt.date.fromisoformat(day) for day in args.prefetch)
+        store.prefetch(location, start, end)
+    if args.import_file:
+        store.import_file(location, args.import_file)
+    print(f"Weather store at {store.path} updated")
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,275 @@
 import argparse
+import cProfile
 import os
 import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from simulation_engine.simulation_generator import SimulationGenerator
+from simulation_engine.recorder import RecordSpec
+from simulation_engine.ensemble import FMUEnsemble
+from simulation_engine.result_writer import RESULT_FORMATS, get_writer, missing_dependency, remove_results
+from simulation_engine.result_cache import ResultCache, CACHE_DIR
 
 
 
 def ensure_dir(path):
     os.makedirs(path, exist_ok=True)
 
-def main():
+def cached_files(args):
+    """
+    Names of the files of a run folder that are stored in the result cache.
+    """
+    return [f"simulation_results{get_writer(args.format).extension}", "metrics.csv", "input_config.json"]
+
+def clear_run_folder(args, sim_folder):
+    """
+    Remove the outputs of a previous run from a run folder: its results in every format and the files
+    served from the cache, which are links into it and must be removed rather than overwritten.
+    """
+    remove_results(sim_folder)
+    for name in cached_files(args):
+        if os.path.lexists(os.path.join(sim_folder, name)):
+            os.remove(os.path.join(sim_folder, name))
+
+def run_simulation(args, i, record):
+    """
+    Run simulation i of the campaign and save its results and metadata.
+    The seed is the run index, so the outcome does not depend on which process runs it.
+    A run with the same inputs as a cached one is served from the result cache instead.
+    """
+    print(f"Running simulation {i+1}/{args.n}...")
+
+    # Prepare result folder
+    sim_folder = os.path.join("simulation_results", args.scenario, args.controller, f"sim_{i+1}")
+    ensure_dir(sim_folder)
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+
+    simulation = SimulationGenerator(
+        scenario_name=args.scenario,
+        duration=args.duration,
+        step_size=args.step_size,
+        controller_type=args.controller,
+        simulation_id=i,
+        seed = i,
+        timing=args.timing,
+        online_metrics=args.online_metrics,
+        control_period=args.control_period
+    )
+
+    metadata = build_metadata(args, i)
+    metadata.update(simulation.controller_metadata())
+    clear_run_folder(args, sim_folder)
+    cache = None
+    if use_cache(args):
+        cache = ResultCache(args.cache_dir, args.cache_size * 2 ** 20 if args.cache_size else None)
+        key = simulation.cache_key(record=record, result_format=args.format, metrics_only=args.metrics_only)
+        if not args.force and cache.fetch(key, sim_folder):
+            simulation.discard_events()
+            metadata["cached"] = True
+            save_metadata(metadata, sim_folder)
+            return
+
+    stream = simulation.result_stream(sim_folder, args.format, metadata, args.chunk_rows) if args.stream else None
+    times, plot_data, simulation_results = simulation.run_simulation(['temperatureSensor.T'], record=record,
+                                                                     stream=stream)
+    if args.metrics_only:
+        # Only the time column was recorded, there are no results to keep
+        simulation_results = None
+    simulation.save_results(times, simulation_results, sim_folder, args.format, metadata)
+    simulation.save_metrics(sim_folder)
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(os.path.join(sim_folder, "profile.prof"))
+    simulation.save_timing(sim_folder)
+    if args.plot : simulation.plot_results(times, plot_data)
+    if cache is not None:
+        cache.store(key, sim_folder, cached_files(args), replace=args.force)
+    save_metadata(metadata, sim_folder)
+
+def use_cache(args):
+    """
+    Whether runs go through the result cache. Timed, profiled and plotted runs always simulate.
+    """
+    return not (args.no_cache or args.timing or args.profile or args.plot)
+
+def build_metadata(args, i):
+    """
+    Describe simulation i of the campaign.
+    """
+    return {
+        "scenario": args.scenario,
+        "simulation_id": i + 1,
+        "controller": args.controller,
+        "duration": args.duration,
+        "step_size": args.step_size,
+        "control_period": args.control_period if args.control_period is not None else args.step_size,
+        "seed": i,
+        "timestamp": datetime.now().isoformat()
+    }
+
+def save_metadata(metadata, sim_folder):
+    """
+    Save the metadata of a simulation next to its results.
+    """
+    with open(os.path.join(sim_folder, "metadata.json"), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    print(f"Simulation {metadata['simulation_id']} complete. Results saved to {sim_folder}")
+
+def run_lockstep(args, record):
+    """
+    Run all simulations of the campaign as one lockstep ensemble with a single batched controller.
+    Inputs and seeds are the same as for separate runs.
+    """
+    simulations = [
+        SimulationGenerator(scenario_name=args.scenario, duration=args.duration, step_size=args.step_size,
+                            controller_type=args.controller, simulation_id=i, seed=i)
+        for i in range(args.n)
+    ]
+    sim_folders = [os.path.join("simulation_results", args.scenario, args.controller, f"sim_{i+1}")
+                   for i in range(args.n)]
+    metadata = [dict(build_metadata(args, i), **simulation.controller_metadata())
+                for i, simulation in enumerate(simulations)]
+    for sim_folder in sim_folders:
+        ensure_dir(sim_folder)
+        clear_run_folder(args, sim_folder)
+    streams = None
+    if args.stream:
+        streams = [simulation.result_stream(sim_folder, args.format, run_metadata, args.chunk_rows)
+                   for simulation, sim_folder, run_metadata in zip(simulations, sim_folders, metadata)]
+
+    ensemble = FMUEnsemble(simulations[0].fmu_path, args.n, stop_time=args.duration, step_size=args.step_size)
+    ensemble.initialize_fmu()
+    results = ensemble.simulate(input_vars=[simulation.simulation_events for simulation in simulations],
+                                controller=simulations[0].controller, plot_vars=['temperatureSensor.T'],
+                                record=record, streams=streams)
+
+    for simulation, sim_folder, run_metadata, (times, plot_data, simulation_results) in zip(
+            simulations, sim_folders, metadata, results):
+        simulation.save_results(times, simulation_results, sim_folder, args.format, run_metadata)
+        save_metadata(run_metadata, sim_folder)
+
+def print_summary(args, completed, failures, elapsed):
+    """
+    Print the throughput of the campaign and the runs that failed.
+    """
+    print(f"\n{completed}/{args.n} simulations completed in {elapsed:.1f} s "
+          f"({completed / elapsed:.2f} runs/s, {completed * args.duration / elapsed:.0f} simulated s per s, "
+          f"{args.jobs} job(s))")
+    for sim_id, error in sorted(failures):
+        print(f"Simulation {sim_id} failed: {error!r}")
+
+def parse_args(argv=None):
+    """
+    Parse and check the command line of a campaign.
+
+    Returns:
+        Tuple[argparse.Namespace, RecordSpec]: The options and the record spec of the runs.
+    """
     parser = argparse.ArgumentParser(description="Run FMU simulations with control.")
     parser.add_argument("--scenario", required=True, help="Name of the scenario.")
     parser.add_argument("--n", type=int, required=True, help="Number of simulations to run.")
     parser.add_argument("--duration", type=float, required=True, help="Simulation duration.")
     parser.add_argument("--step_size", type=float, required=True, help="Simulation step size.")
-    parser.add_argument("--controller", required=True, choices=["pid", "onoff", "fuzzy"], help="Controller type.")
+    parser.add_argument("--control_period", type=float, default=None,
+                        help="Interval between controller updates, a multiple of the step size. The FMU is stepped "
+                             "directly to the next control, recording or input change. Default controls every step.")
+    parser.add_argument("--controller", required=True, choices=["pid", "onoff", "fuzzy", "fuzzy_lookup"], help="Controller type.")
     parser.add_argument("--plot", action="store_true", help="Plot the results.") 
+    parser.add_argument("--record", nargs="+", default=None,
+                        help="Variable names or glob patterns to record. Default records every variable.")
+    parser.add_argument("--record_interval", type=float, default=None,
+                        help="Output interval in seconds. Default records every step.")
+    parser.add_argument("--record_aggregation", choices=RecordSpec.AGGREGATIONS, default=None,
+                        help="Aggregate each output interval instead of sampling it.")
+    parser.add_argument("--format", choices=RESULT_FORMATS, default="csv",
+                        help="Result file format. The columnar formats also store the run metadata.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Write results in chunks while simulating, keeping memory bounded (csv or npz).")
+    parser.add_argument("--chunk_rows", type=int, default=4096, help="Rows per chunk written with --stream.")
+    parser.add_argument("--online_metrics", action="store_true",
+                        help="Compute the control metrics during the simulation and save them as metrics.csv.")
+    parser.add_argument("--metrics_only", action="store_true",
+                        help="Save only the online metrics of each run, without recording its trajectories.")
+    parser.add_argument("--cache_dir", default=CACHE_DIR,
+                        help="Result cache folder. Runs with unchanged inputs and simulator sources are served "
+                             "from it. Installed libraries are not tracked, so clear it after upgrading them.")
+    parser.add_argument("--cache_size", type=float, default=None,
+                        help="Size limit of the result cache in MB, least recently used runs being removed.")
+    parser.add_argument("--no_cache", action="store_true", help="Always simulate, without using the result cache.")
+    parser.add_argument("--force", action="store_true", help="Simulate even cached runs and refresh their cache entries.")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes running simulations.")
+    parser.add_argument("--lockstep", action="store_true",
+                        help="Advance all simulations together in one process with a batched controller.")
+    parser.add_argument("--timing", action="store_true",
+                        help="Save per-phase timers and step latencies of each run as timing.json.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Save a cProfile dump of each run as profile.prof, or of the whole ensemble with --lockstep.")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if missing_dependency(args.format):
+        parser.error(f"--format {args.format} requires {missing_dependency(args.format)}, which is not installed")
+    if args.stream and args.format == "parquet":
+        parser.error("--stream supports the csv and npz formats")
+    if args.plot and args.jobs > 1:
+        parser.error("--plot can only be used with --jobs 1")
+    if args.lockstep and (args.jobs > 1 or args.plot or args.timing or args.online_metrics or args.metrics_only
+                          or args.control_period is not None):
+        parser.error("--lockstep cannot be combined with --jobs, --plot, --timing, --control_period or online metrics")
+    if args.metrics_only and (args.record or args.stream or args.plot):
+        parser.error("--metrics_only cannot be combined with --record, --stream or --plot")
+    args.online_metrics = args.online_metrics or args.metrics_only
+    # With --metrics_only nothing but the time is recorded
+    record = RecordSpec(variables=[] if args.metrics_only else args.record, interval=args.record_interval,
+                        aggregation=args.record_aggregation)
+    return args, record
 
-    for i in range(args.n):
-        print(f"Running simulation {i+1}/{args.n}...")
+def main(argv=None):
+    args, record = parse_args(argv)
 
-        # Prepare result folder
-        sim_folder = os.path.join("simulation_results", args.scenario, args.controller, f"sim_{i+1}")
-        ensure_dir(sim_folder)
+    failures = []
+    start = time.perf_counter()
+    if args.lockstep:
+        # The members advance together, so a failure stops the whole ensemble
+        profiler = cProfile.Profile() if args.profile else None
+        try:
+            if profiler is not None:
+                profiler.enable()
+            run_lockstep(args, record)
+        except Exception as e:
+            failures.extend((i + 1, e) for i in range(args.n))
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                campaign_folder = os.path.join("simulation_results", args.scenario, args.controller)
+                ensure_dir(campaign_folder)
+                profiler.dump_stats(os.path.join(campaign_folder, "profile.prof"))
+    elif args.jobs == 1:
+        for i in range(args.n):
+            try:
+                run_simulation(args, i, record)
+            except Exception as e:
+                failures.append((i + 1, e))
+    else:
+        # Every worker process builds its own FMU instance and controller for each run
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = {pool.submit(run_simulation, args, i, record): i for i in range(args.n)}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failures.append((futures[future] + 1, e))
 
-        simulation = SimulationGenerator(
-            scenario_name=args.scenario,
-            duration=args.duration,
-            step_size=args.step_size,
-            controller_type=args.controller,
-            simulation_id=i,
-            seed = i
-        )
-
-        times, plot_data, simulation_results = simulation.run_simulation(['temperatureSensor.T'])
-        simulation.save_results_to_csv(times, simulation_results, sim_folder)
-        if args.plot : simulation.plot_results(times, plot_data)
-        
-        # Save metadata
-        metadata = {
-            "scenario": args.scenario,
-            "simulation_id": i + 1,
-            "controller": args.controller,
-            "duration": args.duration,
-            "step_size": args.step_size,
-            "timestamp": datetime.now().isoformat()
-        }
-        with open(os.path.join(sim_folder, "metadata.json"), "w") as f:
-            json.dump(metadata, f, indent=2)
-
-        print(f"Simulation {i+1} complete. Results saved to {sim_folder}")
+    print_summary(args, args.n - len(failures), failures, time.perf_counter() - start)
+    if failures:
+        raise SystemExit(1)
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,16 @@
-from typing import Set, List, Dict
-import fmpy
+from typing import List, Dict
+from ctypes import POINTER
+import numpy as np
 import pandas as pd
-from fmpy.fmi2 import FMU2Slave
+from fmpy.fmi2 import FMU2Slave, fmi2ValueReference, fmi2Real, fmi2Integer, fmi2Boolean
 import matplotlib.pyplot as plt
+from simulation_engine.recorder import Recorder, RecordSpec
+from simulation_engine import fmu_cache
+from simulation_engine.instance_pool import InstancePool, default_pool
+from simulation_engine.checkpoint import Checkpoint
+from simulation_engine.profiling import SimulationTimer
+from simulation_engine.result_writer import get_writer, read_results, ChunkWriter
+from simulation_engine.online_metrics import MetricAccumulator
 
 
 class FMUWrapper:
@@ -18,19 +26,29 @@ class FMUWrapper:
         step_size (float): The simulation step size. Default is 0.02.
         model_description: The model description of the FMU, obtained from the FMU file.
         variables (dict): A dictionary containing model variable metadata like type, causality, and value reference.
+        state (StateSnapshot): Batched reader for all model variables, built once from the model description.
+        timing (bool): Whether simulation runs are timed per phase.
+        timer (SimulationTimer): The timers of the current or last run, or None when timing is off.
+        metrics (List[MetricAccumulator]): The online metrics of the current or last run.
+        control_period (float): The interval between controller updates of the current or last run.
     """
 
-    def __init__(self, path: str, stop_time: float = 1000, step_size: float = 0.02, parameters: List[Dict] = []):
+    def __init__(self, path: str, stop_time: float = 1000, step_size: float = 0.02, parameters: List[Dict] = [],
+                 pool: InstancePool = None, timing: bool = False):
         """
         Initialize the FMUWrapper object and read the FMU model description.
+        The description is parsed once per FMU content and then served from the host-wide FMU cache.
 
         Args:
             path (str): The path to the FMU file.
             stop_time (float): The simulation stop time. Default is 1000.
             step_size (float): The step size for simulation. Default is 0.02.
+            parameters (List[Dict]): Parameters set during initialization, as 'name' and 'value' pairs.
+            pool (InstancePool): Pool providing warm FMU instances. Default is the pool shared by the process.
+            timing (bool): Time every phase of the simulation loop, see `SimulationTimer`. Default is False.
         """
 
-        self.model_description = fmpy.read_model_description(path)
+        self.model_description = fmu_cache.read_model_description(path)
         self.start_time = self.model_description.defaultExperiment.startTime
         self.stop_time = stop_time
         self.step_size = step_size
@@ -40,7 +58,13 @@ class FMUWrapper:
                        'valueReference': var.valueReference, 'variability': var.variability}
             for var in self.model_description.modelVariables
         }
+        self.state = StateSnapshot(self.variables)
         self.parameters = parameters
+        self.pool = pool if pool is not None else default_pool
+        self.timing = timing
+        self.timer = None
+        self.metrics = []
+        self.control_period = step_size
 
 
 
@@ -49,15 +73,12 @@ class FMUWrapper:
         """
         Initialize the FMU by extracting, instantiating, and entering initialization mode.
         
-        This prepares the FMU for simulation by performing necessary setup steps.
+        This prepares the FMU for simulation by performing necessary setup steps. The FMU is
+        extracted only once per host, and the instance is taken from the pool, either reset
+        from a previous run or newly instantiated.
         """
 
-        self.fmu = FMU2Slave(guid=self.model_description.guid,
-                             unzipDirectory=fmpy.extract(self.path),
-                             modelIdentifier=self.model_description.coSimulation.modelIdentifier,
-                             instanceName='instance1')
-
-        self.fmu.instantiate()
+        self.fmu = self.pool.acquire(self.model_description, fmu_cache.extract(self.path))
         self.fmu.setupExperiment(startTime=self.start_time)
         self.fmu.enterInitializationMode()
         self.__set_parameters(self.parameters)
@@ -108,40 +129,16 @@ class FMUWrapper:
         
 
 
-    def __get_variable(self, var_name: str):
+    def snapshot(self):
         """
-        Get the value of a variable from the FMU. 
-
-        Args:
-            var_name (str): The name of the variable to retrieve.
+        Read the current value of every model variable with one FMU call per variable type.
 
         Returns:
-            The value of the variable, type depends on the variable's declared type.
-
-        Raises:
-            NameError: If the variable is not found in the model description.
-            ValueError: If the variable's type is unsupported.
+            np.ndarray: The values of all model variables, ordered as `state.names`. The array is
+                        a reusable buffer that is overwritten by the next call.
         """
 
-        variable = self.variables.get(var_name)
-
-        if variable is None:
-            raise NameError(
-                f"Variable '{var_name}' not found in the model description")
-
-        var_type = variable['type']
-        var_ref = variable['valueReference']
-
-        # Retrieve variable value based on its type
-        if var_type == 'Real':
-            return self.fmu.getReal([var_ref])[0]
-        elif var_type == 'Boolean':
-            return self.fmu.getBoolean([var_ref])[0]
-        elif var_type == 'Integer':
-            return self.fmu.getInteger([var_ref])[0]
-        else:
-            raise ValueError(f"Unsupported variable type for variable '{var_name}'. \
-                             The data type for this variable is '{var_type}'")
+        return self.state.read(self.fmu)
 
     def __set_parameters(self, parameters: List[Dict]):
 
@@ -166,7 +163,7 @@ class FMUWrapper:
                 
 
 
-    def simulate(self, input_vars: List[Dict] = None, plot_vars: List[str] = None): 
+    def simulate(self, input_vars: List[Dict] = None, plot_vars: List[str] = None, record: RecordSpec = None): 
         """
         Run the FMU simulation, setting input variables and recording data for plotting.
 
@@ -174,82 +171,80 @@ class FMUWrapper:
             input_vars (List[Dict]): A list of input variables with their values and time intervals.
                                      Default is an empty list.
             plot_vars (List[str]): A list of variable names to track for plotting. Default is an empty list.
+            record (RecordSpec): Which variables to record and at which rate. Plot variables are always
+                                 recorded. Default records every variable at every step.
 
         Returns:
-            times (List[float]): A list of time points for the simulation.
-            plot_data (Dict[str, List[float]]): A dictionary containing the tracked variable values 
-                                                over time for each variable specified in plot_vars.
-            simulation_data (Dict[str, List[float]]): A dictionary containing all variable values over time.
+            times (np.ndarray): The time points of the simulation.
+            plot_data (Dict[str, np.ndarray]): A dictionary containing the tracked variable values 
+                                               over time for each variable specified in plot_vars.
+            simulation_data (pd.DataFrame): The recorded variable values over time, with a 'time' column.
         """
 
-        if plot_vars is None:
-            plot_vars = []
-
-        if input_vars is None:
-            input_vars = []
-
-        time = self.start_time
-        times = []
-        plot_data = {var: [] for var in plot_vars}
-        simulation_data = {var: [] for var in self.variables}
-
-        initialized_variables = set()
-        for input_var in input_vars:
-            var = Input(input_var)
-            # Check if the variable was already defined
-            if var in initialized_variables:
-                raise NameError(
-                    f"Variable '{var.var_name}' already has a value")
-            else:
-                initialized_variables.add(var)
-
-        # Simulation loop
-        while time <= self.stop_time:
-            # Set values for the input variables
-            if initialized_variables:
-                for input_var in initialized_variables:
-                    var_value = input_var.get_value(time)
-                    self.__set_variable(input_var.var_name, var_value, 'input')
-
-            # Gather FMU outputs needed for plotting
-            fmu_variables = {var: self.__get_variable(var) for var in self.variables}
-            # Store current time and variable values
-            times.append(time)
-            for var in plot_vars:
-                plot_data[var].append(self.__get_variable(var))
-            for var in fmu_variables:
-                simulation_data[var].append(self.__get_variable(var))
-
-            # Perform simulation step
-            self.fmu.doStep(currentCommunicationPoint=time,
-                            communicationStepSize=self.step_size)
-            time += self.step_size
-
-            
-        initialized_variables.clear()
-        # Terminate simulation
-        self.fmu.terminate()
-        self.fmu.freeInstance()
-
-        return times, plot_data, simulation_data
+        return self.simulate_with_controller(input_vars=input_vars, plot_vars=plot_vars, record=record)
     
 
-    def simulate_with_controller(self, input_vars=None, controller=None, plot_vars=None):
+    def simulate_with_controller(self, input_vars=None, controller=None, plot_vars=None, record=None,
+                                 checkpoint_interval=None, checkpoint_path=None, stream: ChunkWriter = None,
+                                 metrics: List[MetricAccumulator] = None, control_period: float = None):
         """
         Run the FMU simulation with a controller, setting input variables and recording data for plotting.
 
+        The controller runs every `control_period`, the recorder every recorded step and inputs are set
+        where their schedules change value. Between these events the FMU is advanced with a single
+        `doStep` spanning all the communication steps in between, so the Python loop runs at the event
+        rate rather than at the step size.
+
         Args:
             input_vars (List[Dict]): A list of input variables with their values and time intervals.
             controller (BaseController): An instance of a controller class that implements the update method.
             plot_vars (List[str]): A list of variable names to track for plotting. Default is an empty list.
+            record (RecordSpec): Which variables to record and at which rate. Plot variables are always
+                                 recorded. Default records every variable at every step.
+            checkpoint_interval (float): If set, a checkpoint is written to checkpoint_path every
+                                         checkpoint_interval seconds of simulated time.
+            checkpoint_path (str): The file the periodic checkpoint is written to.
+            stream (ChunkWriter): If set, results are written to this writer in chunks while the
+                                  simulation runs instead of being kept in memory.
+            metrics (List[MetricAccumulator]): Metrics updated at every recorded step, whose values are
+                                               available from `metrics` once the run is finished.
+            control_period (float): The interval between controller updates, a multiple of the step size.
+                                    Default updates the controller at every step.
 
         Returns:
-            times (List[float]): A list of time points for the simulation.
-            plot_data (Dict[str, List[float]]): A dictionary containing the tracked variable values
+            times (np.ndarray): The time points of the simulation.
+            plot_data (Dict[str, np.ndarray]): A dictionary containing the tracked variable values
             over time for each variable specified in plot_vars.
-            simulation_data (Dict[str, List[float]]): A dictionary containing all variable values over time.
+            simulation_data (pd.DataFrame): The recorded variable values over time, with a 'time' column.
+                                            None when the results were streamed.
+        """
+
+        if checkpoint_interval is not None:
+            if checkpoint_path is None:
+                raise ValueError("checkpoint_path is required when checkpoint_interval is set")
+            if stream is not None:
+                raise ValueError("Checkpoints cannot be taken while results are streamed")
+            self.__check_state_support()
+
+        self.start_simulation(input_vars, controller, plot_vars, record, stream, metrics, control_period)
+        if checkpoint_interval is not None:
+            while self.time + checkpoint_interval <= self.stop_time:
+                self.advance(self.time + checkpoint_interval)
+                self.checkpoint().save(checkpoint_path)
+        self.advance()
+        return self.finish_simulation()
+
+
+    def start_simulation(self, input_vars=None, controller=None, plot_vars=None, record=None, stream=None,
+                         metrics=None, control_period=None):
+        """
+        Prepare a simulation run on the initialized FMU, to be driven with `advance` and closed with
+        `finish_simulation`. Arguments are as in `simulate_with_controller`.
+
+        Raises:
+            NameError: If an input variable is defined twice or a plot or metric variable does not exist.
+            ValueError: If the control period or output interval is not a multiple of the step size.
         """
-        
 
         if input_vars is None:
             input_vars = []
@@ -257,10 +252,71 @@ class FMUWrapper:
         if plot_vars is None:
             plot_vars = []
 
-        time = self.start_time
-        times = []
-        plot_data = {var: [] for var in plot_vars}
-        simulation_data = {var: [] for var in self.variables}
+        self.time = self.start_time
+        self.controller = controller
+        self.plot_vars = plot_vars
+        self.state.indices(plot_vars)  # fail early on unknown plot variables
+        self.inputs = self.__load_inputs(input_vars)
+        self.recorder = Recorder(self.state.names, self.start_time, self.stop_time, self.step_size,
+                                 spec=record, required=plot_vars, sink=stream, dtypes=self.state.dtypes)
+        self.timer = SimulationTimer() if self.timing else None
+        self.metrics = list(metrics or [])
+        for metric in self.metrics:
+            metric.bind(self.state.index)
+        self.__set_control_period(control_period)
+        self.__schedule(self.time)
+
+
+    def __set_control_period(self, control_period: float):
+        """
+        Set the interval between controller updates and its number of communication steps.
+
+        Raises:
+            ValueError: If the control period is not a multiple of the step size.
+        """
+
+        self.control_period = self.step_size if control_period is None else control_period
+        control_steps = round(self.control_period / self.step_size)
+        if control_steps < 1 or not np.isclose(control_steps * self.step_size, self.control_period):
+            raise ValueError(f"Control period {self.control_period} is not a multiple of the step size {self.step_size}")
+        self.__control_steps = control_steps
+
+
+    def __schedule(self, time: float):
+        """
+        Compute the communication points of the run and the steps from `time` on at which the
+        simulation loop stops: control updates, recorded steps and changes of the input schedules.
+        """
+
+        n_steps = int(np.floor((self.stop_time - self.start_time) / self.step_size)) + 2
+        # Accumulated one step at a time, as the time of a loop stopping at every step would be
+        grid = np.add.accumulate(np.r_[self.start_time, np.full(n_steps, self.step_size)])
+        # The points up to the stop time, followed by the one the last step ends at
+        n_points = int(np.searchsorted(grid, self.stop_time, side='right'))
+        grid = grid[:n_points + 1]
+        first = int(np.searchsorted(grid, time))
+
+        record_steps = 1 if self.recorder.aggregation is not None else self.recorder.decimation
+        if self.__control_steps == 1 or record_steps == 1:
+            events = range(first, n_points + 1)
+        else:
+            steps = [np.arange(0, n_points, self.__control_steps), np.arange(0, n_points, record_steps),
+                     [first, n_points]]
+            for input_var in self.inputs:
+                values = input_var.values_at(grid[:n_points])
+                steps.append(np.flatnonzero(values[1:] != values[:-1]) + 1)
+            events = np.unique(np.concatenate(steps).astype(np.int64))
+            events = events[events >= first].tolist()
+
+        self.__grid = grid.tolist()
+        self.__events = events
+        self.__event = 0
+
+
+    def __load_inputs(self, input_vars: List[Dict]):
+        """
+        Build the input schedules of a simulation.
+        """
 
         initialized_variables = set()
         for input_var in input_vars:
@@ -271,46 +327,190 @@ class FMUWrapper:
                     f"Variable '{var.var_name}' already has a value")
             else:
                 initialized_variables.add(var)
+        return initialized_variables
+
+
+    def advance(self, until: float = None):
+        """
+        Run the simulation loop for every event up to and including `until`. The step from the last
+        event ends at the next one, which may lie after `until`.
+
+        Args:
+            until (float): The last communication point to simulate. Default is the stop time.
+        """
+
+        stop_time = self.stop_time if until is None else min(until, self.stop_time)
+        controller = self.controller
+        recorder = self.recorder
+        metrics = self.metrics
+        timer = self.timer
+        grid = self.__grid
+        events = self.__events
+        event = self.__event
+        control_steps = self.__control_steps
+        decimation = recorder.decimation
+        record_every_step = recorder.aggregation is not None
+        step = events[event]
+        time = grid[step]
+
+        # Simulation loop, stopping at each event
+        while time <= stop_time:
+            if timer is not None:
+                started = mark = timer.clock()
 
-        # Simulation loop
-        while time <= self.stop_time:
             # Set values for the input variables
-            if initialized_variables:
-                for input_var in initialized_variables:
+            if self.inputs:
+                for input_var in self.inputs:
                     var_value = input_var.get_value(time)
-                    self.__set_variable(input_var.var_name, var_value, 'input')
+                    # Only call into the FMU when the scheduled value changes
+                    if var_value != input_var.last_value:
+                        self.__set_variable(input_var.var_name, var_value, 'input')
+                        input_var.last_value = var_value
+                if timer is not None:
+                    mark = timer.lap('inputs', mark)
 
             # Gather FMU outputs needed for controller
-            fmu_variables = {var: self.__get_variable(var) for var in self.variables}
-            # Run controllers and set controller-driven inputs
-            if controller is not None:
-                control_updates = controller.update(fmu_variables, self.step_size)
+            values = self.snapshot()
+            if timer is not None:
+                mark = timer.lap('state_read', mark)
+            # Run controllers and set controller-driven inputs, held until the next control step
+            if controller is not None and step % control_steps == 0:
+                fmu_variables = self.state.as_dict()
+                control_updates = controller.update(fmu_variables, self.control_period)
                 for var_name, value in control_updates.items():
                     self.__set_variable(var_name, value, 'input')
+                if timer is not None:
+                    mark = timer.lap('controller', mark)
+                # Controller inputs change dependent outputs, so read the state again before recording
+                values = self.snapshot()
+                if timer is not None:
+                    mark = timer.lap('state_read', mark)
 
             # Store current time and variable values
-            times.append(time)
-            for var in plot_vars:
-                #print(f"Plotting variable: {var} at time {time}")
-                plot_data[var].append(self.__get_variable(var))
-            for var in fmu_variables:
-                simulation_data[var].append(self.__get_variable(var))
-
-            # Perform simulation step
+            recorded = step % decimation == 0
+            if recorded or record_every_step:
+                recorder.record(time, values, step)
+                if timer is not None:
+                    mark = timer.lap('recording', mark)
+
+            if metrics and recorded:
+                for metric in metrics:
+                    metric.update(time, values)
+                if timer is not None:
+                    mark = timer.lap('metrics', mark)
+
+            # Perform simulation step up to the next event
+            event += 1
+            next_step = events[event]
             self.fmu.doStep(currentCommunicationPoint=time, 
-                            communicationStepSize=self.step_size)
-            time += self.step_size
+                            communicationStepSize=(next_step - step) * self.step_size)
+            if timer is not None:
+                timer.lap('do_step', mark)
+                timer.step(started)
+            step = next_step
+            time = grid[step]
 
-        initialized_variables.clear()
-        # Terminate simulation
+        self.time = time
+        self.__event = event
+
+
+    def finish_simulation(self):
+        """
+        Terminate the simulation run and return its results, as described in `simulate_with_controller`.
+        """
+
+        self.inputs.clear()
+        # Terminate simulation and return the instance to the pool
         self.fmu.terminate()
-        self.fmu.freeInstance()
+        self.pool.release(self.fmu)
+        self.recorder.close()
 
-        return times, plot_data, simulation_data
+        return self.__collect_results(self.recorder, self.plot_vars)
+
+
+    def checkpoint(self) -> Checkpoint:
+        """
+        Capture the state of the running simulation at the next communication point.
+
+        Returns:
+            Checkpoint: The FMU state, controller, input schedules and recorded results.
+
+        Raises:
+            RuntimeError: If the FMU cannot get and serialize its state, or results are streamed.
+        """
+
+        self.__check_state_support()
+        if self.recorder.sink is not None:
+            raise RuntimeError("Checkpoints cannot be taken while results are streamed")
+        fmu_state = self.fmu.getFMUstate()
+        try:
+            serialized = self.fmu.serializeFMUstate(fmu_state)
+        finally:
+            self.fmu.freeFMUstate(fmu_state)
+        return Checkpoint(self.time, serialized, self.controller, self.inputs, self.recorder, self.plot_vars,
+                          self.metrics, self.control_period)
+
+
+    def restore(self, checkpoint: Checkpoint, input_vars: List[Dict] = None, controller=None):
+        """
+        Resume a simulation from a checkpoint on a fresh FMU instance. The run then continues with
+        `advance` and `finish_simulation`. Several branches can be restored from the same checkpoint.
+
+        Args:
+            checkpoint (Checkpoint): The checkpoint to resume from.
+            input_vars (List[Dict]): Input schedules replacing those of the checkpoint, e.g. different
+                                     window events after the checkpoint time. Default keeps them.
+            controller (BaseController): A controller replacing the copy stored in the checkpoint, e.g.
+                                         with another setpoint. Default keeps the stored one.
+
+        Raises:
+            RuntimeError: If the FMU cannot set and deserialize its state.
+        """
+
+        self.__check_state_support()
+        self.initialize_fmu()
+        fmu_state = self.fmu.deSerializeFMUstate(checkpoint.fmu_state)
+        try:
+            self.fmu.setFMUstate(fmu_state)
+        finally:
+            self.fmu.freeFMUstate(fmu_state)
+
+        stored_controller, inputs, recorder, metrics = checkpoint.branch()
+        self.time = checkpoint.time
+        self.controller = controller if controller is not None else stored_controller
+        self.inputs = self.__load_inputs(input_vars) if input_vars is not None else set(inputs)
+        self.recorder = recorder
+        self.metrics = metrics
+        self.plot_vars = checkpoint.plot_vars
+        self.timer = SimulationTimer() if self.timing else None
+        self.__set_control_period(checkpoint.control_period)
+        self.__schedule(self.time)
+
+
+    def __check_state_support(self):
+        co_simulation = self.model_description.coSimulation
+        if not (co_simulation.canGetAndSetFMUstate and co_simulation.canSerializeFMUstate):
+            raise RuntimeError(
+                f"FMU '{co_simulation.modelIdentifier}' does not support getting and serializing its state")
 
     
 
 
+    def __collect_results(self, recorder: Recorder, plot_vars: List[str]):
+        """
+        Expose the recorded simulation as time points, plot data and full results, all sharing
+        memory with the recorder buffer. Streamed results are not loaded back: only the time and
+        plot variables are read from the written file.
+        """
+
+        if recorder.sink is not None:
+            frame, _ = read_results(recorder.sink.path, ['time'] + list(plot_vars))
+            return frame['time'].to_numpy(), {var: frame[var].to_numpy() for var in plot_vars}, None
+
+        times = recorder.column('time')
+        plot_data = {var: recorder.column(var) for var in plot_vars}
+        return times, plot_data, recorder.to_dataframe()
+
     def plot_results(self, times: List[float], plot_data: Dict[str, List[float]]):
         """
         Plot the results of the simulation.
@@ -328,19 +528,38 @@ class FMUWrapper:
         plt.legend()
         plt.show()
 
-    def save_results_to_csv(self,times, simulation_data: Dict[str, List[float]], filename: str):
+    def save_results_to_csv(self,times, simulation_data, filename: str):
         """
         Save the simulation results to a CSV file.
 
         Args:
             times (List[float]): A list of time points from the simulation.
-            plot_data (Dict[str, List[float]]): A dictionary of variable values over time to save.
+            simulation_data (pd.DataFrame | Dict[str, List[float]]): The variable values over time to save.
+                                 A DataFrame that already has a 'time' column is written as is.
             filename (str): The name of the file to save the results to.
         """
         
-        df = pd.DataFrame(simulation_data)
-        df['time'] = times
-        df.to_csv(filename, index=False)
+        self.save_results(times, simulation_data, filename, 'csv')
+
+    def save_results(self, times, simulation_data, filename: str, result_format: str = 'csv', metadata: dict = None):
+        """
+        Save the simulation results in one of the formats of `result_writer`.
+
+        Args:
+            times (List[float]): A list of time points from the simulation.
+            simulation_data (pd.DataFrame | Dict[str, List[float]]): The variable values over time to save.
+                                 A DataFrame that already has a 'time' column is written as is.
+            filename (str): The name of the file to save the results to.
+            result_format (str): 'csv', 'npz' or 'parquet'. Default is 'csv'.
+            metadata (dict): Run metadata stored in the file by the columnar formats.
+        """
+
+        if isinstance(simulation_data, pd.DataFrame) and 'time' in simulation_data.columns:
+            df = simulation_data
+        else:
+            df = pd.DataFrame(simulation_data)
+            df['time'] = times
+        get_writer(result_format).write(df, filename, metadata)
 
     def print_input_variables(self):
         """
@@ -365,6 +584,117 @@ class FMUWrapper:
 
 
 
+class StateSnapshot:
+    """
+    Batched reader for the values of all model variables of an FMU.
+
+    Value references are grouped by type once, when the snapshot is built, so that a read costs a single
+    `fmi2GetReal`, `fmi2GetInteger` and `fmi2GetBoolean` call, each filling a preallocated buffer.
+    Integer and Boolean values are stored as floats in the shared `values` buffer, and their type is
+    kept in `dtypes` so that recorded results can be written with it.
+
+    Attributes:
+        names (List[str]): The variable names, in model description order.
+        values (np.ndarray): Buffer holding the values of the last read, ordered as `names`.
+        index (Dict[str, int]): Position of each variable in `names` and `values`.
+        dtypes (Dict[str, np.dtype]): The type of each variable that is not Real, as read from the FMU.
+    """
+
+    # FMI getter and C type of the value buffer for each supported variable type
+    _GETTERS = {
+        'Real': ('fmi2GetReal', fmi2Real, np.float64),
+        'Integer': ('fmi2GetInteger', fmi2Integer, np.int32),
+        'Enumeration': ('fmi2GetInteger', fmi2Integer, np.int32),
+        'Boolean': ('fmi2GetBoolean', fmi2Boolean, np.int32),
+    }
+
+    # Type of the recorded values of each variable type that is not Real
+    _DTYPES = {'Integer': np.int32, 'Enumeration': np.int32, 'Boolean': np.bool_}
+
+    def __init__(self, variables: Dict[str, Dict]):
+        """
+        Group the value references of the given variables by type and allocate the read buffers.
+
+        Args:
+            variables (Dict[str, Dict]): Variable metadata keyed by name, as in `FMUWrapper.variables`.
+
+        Raises:
+            ValueError: If a variable has a type that cannot be read in batch.
+        """
+
+        self.names = list(variables)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.values = np.zeros(len(self.names), dtype=np.float64)
+        self.dtypes = {}
+
+        references = {}
+        for i, (name, variable) in enumerate(variables.items()):
+            var_type = variable['type']
+            if var_type not in self._GETTERS:
+                raise ValueError(f"Unsupported variable type for variable '{name}'. \
+                                 The data type for this variable is '{var_type}'")
+            if var_type != 'Real':
+                self.dtypes[name] = np.dtype(self._DTYPES[var_type])
+            positions, refs = references.setdefault(self._GETTERS[var_type], ([], []))
+            positions.append(i)
+            refs.append(variable['valueReference'])
+
+        self._groups = []
+        for (getter, c_type, np_type), (positions, refs) in references.items():
+            # Aliases share a value reference, so each distinct reference is fetched once
+            unique_refs, inverse = np.unique(refs, return_inverse=True)
+            vr = (fmi2ValueReference * len(unique_refs))(*unique_refs.tolist())
+            buffer = np.zeros(len(unique_refs), dtype=np_type)
+            self._groups.append((getter, vr, len(unique_refs), buffer,
+                                 buffer.ctypes.data_as(POINTER(c_type)),
+                                 np.asarray(positions), inverse))
+
+    def read(self, fmu: FMU2Slave) -> np.ndarray:
+        """
+        Read all variables from the FMU into `values`.
+
+        Args:
+            fmu (FMU2Slave): The instantiated FMU to read from.
+
+        Returns:
+            np.ndarray: The `values` buffer, overwritten in place.
+        """
+
+        for getter, vr, nvr, buffer, pointer, positions, inverse in self._groups:
+            getattr(fmu, getter)(fmu.component, vr, nvr, pointer)
+            self.values[positions] = buffer[inverse]
+        return self.values
+
+    def as_dict(self) -> Dict[str, float]:
+        """
+        Return the values of the last read as a dictionary keyed by variable name.
+        """
+
+        return dict(zip(self.names, self.values.tolist()))
+
+    def indices(self, var_names: List[str]) -> List[int]:
+        """
+        Resolve variable names to their positions in `values`.
+
+        Args:
+            var_names (List[str]): The variable names to resolve.
+
+        Returns:
+            List[int]: The position of each variable in `values`.
+
+        Raises:
+            NameError: If a variable is not found in the model description.
+        """
+
+        for var_name in var_names:
+            if var_name not in self.index:
+                raise NameError(
+                    f"Variable '{var_name}' not found in the model description")
+        return [self.index[var_name] for var_name in var_names]
+
+
+
+
 class Input:
     """
     Class to represent an input variable with time-dependent values and perform operations 
@@ -375,12 +705,14 @@ class Input:
         var_name (str): The name of the variable.
         values (list): A list of dictionaries each containing 'value', 'start_time', and 'end_time'
         default: The default value to be returned if no time range matches a given time.
+        breakpoints (np.ndarray): Sorted times at which the value of the variable may change.
+        last_value: The value most recently applied to the FMU, or None before the first step.
     """
      
     def __init__(self, input_var: Dict):
         """
-        Initializes the Input object with the provided variable details and checks for 
-        overlapping time ranges.
+        Initializes the Input object with the provided variable details, checks for 
+        overlapping time ranges and compiles them into a piecewise-constant schedule.
 
         Args:
             input_var (dict): A dictionary containing the variable name, a list of time ranges, 
@@ -391,7 +723,37 @@ class Input:
         self.var_name = self.var['variable']
         self.values = self.var['values']
         self.default = self.var['default']
+        self.last_value = None
         self.check_overlap()
+        self.compile()
+
+
+    def compile(self):
+        """
+        Compiles the time ranges into sorted breakpoints, where the value on
+        [breakpoints[i], breakpoints[i+1]) is `_pieces[i]`. Gaps between ranges take the default
+        value. The lookup cursor is reset to the start of the schedule.
+        """
+
+        breakpoints = []
+        pieces = []
+        for value in sorted(self.values, key=lambda x: x['start_time']):
+            if value['end_time'] == value['start_time']:
+                continue  # empty ranges never match
+            if breakpoints and breakpoints[-1] == value['start_time']:
+                # Contiguous with the previous range, replace the default piece that closed it
+                pieces[-1] = value['value']
+            else:
+                breakpoints.append(value['start_time'])
+                pieces.append(value['value'])
+            breakpoints.append(value['end_time'])
+            pieces.append(self.default)
+
+        self.breakpoints = np.asarray(breakpoints, dtype=np.float64)
+        self._pieces = pieces
+        # Appending the default lets index -1 (before the first breakpoint) select it
+        self._piece_array = np.asarray(pieces + [self.default])
+        self._cursor = -1
 
 
     def check_overlap(self):
@@ -428,6 +790,9 @@ class Input:
         If the time falls within a specific time range, the associated value is returned.
         If no time range matches, the default value is returned.
 
+        The lookup advances a cursor over the compiled breakpoints, so querying increasing
+        times costs O(1) amortized. Querying an earlier time falls back to a binary search.
+
         Args:
             time (float): The time for which the variable's value is to be retrieved.
 
@@ -436,12 +801,27 @@ class Input:
             If no time range matches, returns the default value.
         """
 
-        # Check if time falls within any of the time ranges
-        for value in self.values:
-            if value['start_time'] <= time < value['end_time']:
-                return value['value']
-        # Return default if no range matches the time
-        return self.default
+        breakpoints = self.breakpoints
+        cursor = self._cursor
+        if cursor >= 0 and time < breakpoints[cursor]:
+            cursor = int(np.searchsorted(breakpoints, time, side='right')) - 1
+        while cursor + 1 < len(breakpoints) and time >= breakpoints[cursor + 1]:
+            cursor += 1
+        self._cursor = cursor
+
+        return self._pieces[cursor] if cursor >= 0 else self.default
+
 
+    def values_at(self, times) -> np.ndarray:
+        """
+        Retrieves the values of the variable at many times at once.
+
+        Args:
+            times (array-like): The times for which the variable's values are to be retrieved.
 
+        Returns:
+            np.ndarray: The value of the variable at each of the given times.
+        """
 
+        indices = np.searchsorted(self.breakpoints, np.asarray(times, dtype=np.float64), side='right') - 1
+        return self._piece_array[indices]
@@ -0,0 +1,58 @@
+import copy
+import pickle
+
+
+class Checkpoint:
+    """
+    Snapshot of a running FMUWrapper simulation, from which it can be resumed or forked.
+
+    A checkpoint holds everything the simulation loop depends on at the next communication point:
+    the serialized FMU state, a copy of the controller with its internal state (e.g. the PID integral
+    and previous error), the input schedules with their cursors, and the results recorded so far.
+    Restoring hands out fresh copies, so any number of branches can be forked from one checkpoint.
+
+    Attributes:
+        time (float): The communication point at which the simulation continues.
+        fmu_state (bytes): The FMU state, as returned by `fmi2SerializeFMUstate`.
+        controller: A copy of the controller, or None for simulations without a controller.
+        inputs (list): Copies of the input schedules of the simulation.
+        recorder (Recorder): A copy of the recorder holding the results up to `time`.
+        plot_vars (List[str]): The variables tracked for plotting.
+        metrics (list): Copies of the online metric accumulators, with their values up to `time`.
+        control_period (float): The interval between controller updates, or None for every step.
+    """
+
+    def __init__(self, time, fmu_state, controller, inputs, recorder, plot_vars, metrics=None, control_period=None):
+        self.time = time
+        self.fmu_state = fmu_state
+        self.controller = copy.deepcopy(controller)
+        self.inputs = copy.deepcopy(list(inputs))
+        self.recorder = copy.deepcopy(recorder)
+        self.plot_vars = list(plot_vars)
+        self.metrics = copy.deepcopy(list(metrics or []))
+        self.control_period = control_period
+
+    def branch(self):
+        """
+        Return independent copies of the controller, inputs, recorder and metrics for a new branch.
+        """
+
+        return (copy.deepcopy(self.controller), copy.deepcopy(self.inputs), copy.deepcopy(self.recorder),
+                copy.deepcopy(self.metrics))
+
+    def save(self, path: str):
+        """
+        Write the checkpoint to a file, e.g. to resume a long run after a crash.
+        """
+
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path: str) -> "Checkpoint":
+        """
+        Read a checkpoint written by `save`.
+        """
+
+        with open(path, "rb") as f:
+            return pickle.load(f)
@@ -0,0 +1,227 @@
+from typing import List, Dict
+import numpy as np
+from simulation_engine.FMUWrapper import FMUWrapper, StateSnapshot, Input
+from simulation_engine.recorder import Recorder, RecordSpec
+from simulation_engine.result_writer import read_results
+from simulation_engine.instance_pool import InstancePool
+
+
+class FMUEnsemble:
+    """
+    N instances of the same FMU advanced in lockstep, driven by one batched controller.
+
+    At every communication point the outputs of all members are read into an (N x variables) array,
+    the controller computes the outputs of all members with a single `update_batch` call, and the
+    results are written back before every member takes its step. The members share the model
+    description, the loaded binary and, when all members get the same inputs, the input schedules.
+
+    Attributes:
+        path (str): The file path to the FMU.
+        size (int): The number of members.
+        stop_time (float): The simulation end time.
+        step_size (float): The simulation step size.
+        members (List[FMUWrapper]): One wrapper per member, holding its FMU instance.
+        variables (dict): Model variable metadata, as in `FMUWrapper.variables`.
+        state (StateSnapshot): Batched reader shared by all members.
+        states (np.ndarray): The (N x variables) values of the last read, columns ordered as `state.names`.
+    """
+
+    def __init__(self, path: str, size: int, stop_time: float = 1000, step_size: float = 0.02,
+                 parameters: List = None, pool: InstancePool = None):
+        """
+        Initialize the ensemble and read the FMU model description.
+
+        Args:
+            path (str): The path to the FMU file.
+            size (int): The number of members.
+            stop_time (float): The simulation stop time. Default is 1000.
+            step_size (float): The step size for simulation. Default is 0.02.
+            parameters (List): Parameters set during initialization, as 'name' and 'value' pairs, either
+                               one list applied to every member or one list per member.
+            pool (InstancePool): Pool providing warm FMU instances. Default is the pool shared by the process.
+
+        Raises:
+            ValueError: If size is not positive or per-member parameters do not match the size.
+        """
+
+        if size < 1:
+            raise ValueError("An ensemble needs at least one member")
+        parameters = self.__per_member(parameters, size, "parameters")
+        self.path = path
+        self.size = size
+        self.stop_time = stop_time
+        self.step_size = step_size
+        self.members = [FMUWrapper(path, stop_time, step_size, member_parameters, pool)
+                        for member_parameters in parameters]
+        self.start_time = self.members[0].start_time
+        self.variables = self.members[0].variables
+        self.state = StateSnapshot(self.variables)
+        self.states = np.zeros((size, len(self.state.names)))
+        # Column views of `states`, updated in place by every read
+        self.columns = {name: self.states[:, i] for i, name in enumerate(self.state.names)}
+
+    @staticmethod
+    def __per_member(values, size, what):
+        """
+        Expand a list shared by all members, or check a list given per member.
+        """
+
+        if not values:
+            return [[] for _ in range(size)]
+        if all(isinstance(value, list) for value in values):
+            if len(values) != size:
+                raise ValueError(f"Expected {what} for {size} members, got {len(values)}")
+            return values
+        return [values] * size
+
+    def initialize_fmu(self):
+        """
+        Initialize the FMU instance of every member, as in `FMUWrapper.initialize_fmu`.
+        """
+
+        for member in self.members:
+            member.initialize_fmu()
+
+    def __set_input(self, fmu, var_name: str, var_value):
+        """
+        Set the value of an input variable of one member.
+
+        Raises:
+            NameError: If the variable is not found or is not an input.
+            ValueError: If the variable type does not match the provided value type.
+        """
+
+        variable = self.variables.get(var_name)
+        if variable is None:
+            raise NameError(
+                f"Variable '{var_name}' not found in the model description")
+        if variable['causality'] != 'input':
+            raise NameError(
+                f"Variable '{var_name}' cannot be modified because it is not an input variable")
+
+        var_type = variable['type']
+        var_ref = variable['valueReference']
+        if var_type == 'Boolean' and isinstance(var_value, (bool, np.bool_)):
+            fmu.setBoolean([var_ref], [bool(var_value)])
+        elif var_type == 'Real' and isinstance(var_value, float):
+            fmu.setReal([var_ref], [var_value])
+        elif var_type == 'Integer' and isinstance(var_value, (int, np.integer)):
+            fmu.setInteger([var_ref], [int(var_value)])
+        else:
+            raise ValueError(f"Unsupported variable type for variable '{var_name}'. \
+                             The correct data type for this variable is '{var_type}'")
+
+    def __load_inputs(self, input_vars):
+        """
+        Build the input schedules as (member indices, schedules) groups. Inputs shared by all members
+        form a single group, so each schedule is evaluated once per step for the whole ensemble.
+        """
+
+        shared = not input_vars or not all(isinstance(member_vars, list) for member_vars in input_vars)
+        input_vars = [input_vars or []] if shared else self.__per_member(input_vars, self.size, "inputs")
+
+        groups = []
+        for i, member_vars in enumerate(input_vars):
+            schedules = []
+            for input_var in member_vars:
+                var = Input(input_var)
+                if any(schedule.var_name == var.var_name for schedule in schedules):
+                    raise NameError(
+                        f"Variable '{var.var_name}' already has a value")
+                schedules.append(var)
+            groups.append((range(self.size) if shared else [i], schedules))
+        return groups
+
+    def __read_states(self):
+        """
+        Read all variables of every member into `states`.
+        """
+
+        for i, member in enumerate(self.members):
+            self.states[i] = self.state.read(member.fmu)
+        return self.states
+
+    def simulate(self, input_vars: List = None, controller=None, plot_vars: List[str] = None,
+                 record: RecordSpec = None, streams: List = None):
+        """
+        Run all members from the start to the stop time in lockstep.
+
+        Args:
+            input_vars (List): Input variables with their values and time intervals, either one list
+                               applied to every member or one list per member.
+            controller (BaseController): A controller implementing `update_batch`, whose state holds
+                                         one entry per member. Default runs without a controller.
+            plot_vars (List[str]): Variable names to track for plotting. Default is an empty list.
+            record (RecordSpec): Which variables to record and at which rate, for every member.
+            streams (List[ChunkWriter]): One writer per member the results are written to in chunks
+                                         while the ensemble runs. Default keeps the results in memory.
+
+        Returns:
+            List[Tuple[np.ndarray, Dict[str, np.ndarray], pd.DataFrame]]: The times, plot data and
+            recorded variables of each member, as returned by `FMUWrapper.simulate_with_controller`.
+
+        Raises:
+            NameError: If an input variable is defined twice or a plot variable does not exist.
+            ValueError: If the number of streams does not match the size.
+        """
+
+        plot_vars = plot_vars or []
+        self.state.indices(plot_vars)  # fail early on unknown plot variables
+        groups = self.__load_inputs(input_vars)
+        if streams is None:
+            streams = [None] * self.size
+        elif len(streams) != self.size:
+            raise ValueError(f"Expected streams for {self.size} members, got {len(streams)}")
+        recorders = [Recorder(self.state.names, self.start_time, self.stop_time, self.step_size,
+                              spec=record, required=plot_vars, sink=stream, dtypes=self.state.dtypes)
+                     for stream in streams]
+        fmus = [member.fmu for member in self.members]
+        time = self.start_time
+
+        # Simulation loop
+        while time <= self.stop_time:
+            # Set values for the input variables
+            for members, schedules in groups:
+                for input_var in schedules:
+                    var_value = input_var.get_value(time)
+                    # Only call into the FMUs when the scheduled value changes
+                    if var_value != input_var.last_value:
+                        for i in members:
+                            self.__set_input(fmus[i], input_var.var_name, var_value)
+                        input_var.last_value = var_value
+
+            states = self.__read_states()
+            # Run the controller once for all members and set its outputs
+            if controller is not None:
+                control_updates = controller.update_batch(self.columns, self.step_size)
+                for var_name, values in control_updates.items():
+                    values = np.broadcast_to(values, self.size)
+                    for fmu, value in zip(fmus, values):
+                        self.__set_input(fmu, var_name, value)
+                # Controller inputs change dependent outputs, so read the states again before recording
+                states = self.__read_states()
+
+            for recorder, values in zip(recorders, states):
+                recorder.record(time, values)
+
+            for fmu in fmus:
+                fmu.doStep(currentCommunicationPoint=time,
+                           communicationStepSize=self.step_size)
+            time += self.step_size
+
+        # Terminate every member and return the instances to the pool
+        for member in self.members:
+            member.fmu.terminate()
+            member.pool.release(member.fmu)
+
+        results = []
+        for recorder in recorders:
+            recorder.close()
+            if recorder.sink is not None:
+                # Streamed results are not loaded back, only the time and plot variables
+                frame, _ = read_results(recorder.sink.path, ['time'] + plot_vars)
+                results.append((frame['time'].to_numpy(), {var: frame[var].to_numpy() for var in plot_vars}, None))
+            else:
+                results.append((recorder.column('time'), {var: recorder.column(var) for var in plot_vars},
+                                recorder.to_dataframe()))
+        return results
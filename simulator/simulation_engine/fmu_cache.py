@@ -0,0 +1,119 @@
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import fmpy
+
+# Root of the host-wide cache, shared by every run and worker process
+CACHE_DIR = os.environ.get("FMU_CACHE_DIR", os.path.join(tempfile.gettempdir(), "fmu_cache"))
+# Entries not used for this long are removed when a new FMU is extracted
+MAX_AGE = 7 * 24 * 3600
+# Partially extracted entries older than this are considered abandoned
+PARTIAL_MAX_AGE = 3600
+
+COMPLETE_MARKER = ".complete"
+DESCRIPTION_FILE = "model_description.pickle"
+PARTIAL_PREFIX = ".partial-"
+
+# In-process memo of content hashes and parsed model descriptions
+_hashes = {}
+_descriptions = {}
+
+
+def content_hash(path: str) -> str:
+    """
+    Return the SHA-256 digest of an FMU file. The digest is memoized per path, size and mtime,
+    so the file is only hashed again when it changes.
+    """
+
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _hashes[key] = digest.hexdigest()
+    return _hashes[key]
+
+
+def extract(path: str) -> str:
+    """
+    Return the directory holding the extracted contents of an FMU, extracting it on first use.
+
+    Entries are keyed by the FMU content hash, so every run and worker on the host shares one
+    extraction. A new entry is unzipped into a private directory and renamed into place, which
+    keeps concurrent workers from observing a partial extraction.
+
+    Args:
+        path (str): The path to the FMU file.
+
+    Returns:
+        str: The path to the extracted FMU directory.
+    """
+
+    unzip_dir = os.path.join(CACHE_DIR, content_hash(path))
+    if os.path.exists(os.path.join(unzip_dir, COMPLETE_MARKER)):
+        os.utime(unzip_dir)  # mark as recently used
+        return unzip_dir
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    clean_stale()
+    partial_dir = tempfile.mkdtemp(prefix=PARTIAL_PREFIX, dir=CACHE_DIR)
+    fmpy.extract(path, unzipdir=partial_dir)
+    with open(os.path.join(partial_dir, DESCRIPTION_FILE), "wb") as f:
+        pickle.dump(fmpy.read_model_description(partial_dir), f)
+    open(os.path.join(partial_dir, COMPLETE_MARKER), "w").close()
+
+    try:
+        os.rename(partial_dir, unzip_dir)
+    except OSError:
+        # Another process completed the same entry first
+        shutil.rmtree(partial_dir, ignore_errors=True)
+        if not os.path.exists(os.path.join(unzip_dir, COMPLETE_MARKER)):
+            raise
+    return unzip_dir
+
+
+def read_model_description(path: str):
+    """
+    Return the parsed model description of an FMU, reusing the copy stored with its cached extraction.
+
+    Args:
+        path (str): The path to the FMU file.
+
+    Returns:
+        fmpy.model_description.ModelDescription: The model description of the FMU.
+    """
+
+    key = content_hash(path)
+    if key not in _descriptions:
+        unzip_dir = extract(path)
+        try:
+            with open(os.path.join(unzip_dir, DESCRIPTION_FILE), "rb") as f:
+                _descriptions[key] = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, AttributeError, ImportError):
+            # Stored by an incompatible FMPy version, parse the extracted XML instead
+            _descriptions[key] = fmpy.read_model_description(unzip_dir)
+    return _descriptions[key]
+
+
+def clean_stale(max_age: float = MAX_AGE):
+    """
+    Remove cache entries unused for longer than max_age seconds, and partial extractions left
+    behind by interrupted processes.
+    """
+
+    if not os.path.isdir(CACHE_DIR):
+        return
+    now = time.time()
+    for name in os.listdir(CACHE_DIR):
+        entry = os.path.join(CACHE_DIR, name)
+        limit = PARTIAL_MAX_AGE if name.startswith(PARTIAL_PREFIX) else max_age
+        try:
+            if now - os.path.getmtime(entry) > limit:
+                shutil.rmtree(entry, ignore_errors=True)
+        except OSError:
+            continue  # removed concurrently
@@ -0,0 +1,93 @@
+import atexit
+import itertools
+import os
+from fmpy.fmi2 import FMU2Slave
+
+
+class InstancePool:
+    """
+    Pool of instantiated FMUs that are reset and reused across simulation runs.
+
+    Acquiring an instance returns an idle one after `fmi2Reset`, or instantiates a new one when none
+    is idle, so the shared library and the solver memory are only set up once per concurrent run.
+    Every instance gets a unique name, which lets several instances of one FMU live in a process.
+
+    Attributes:
+        max_idle (int): Maximum number of idle instances kept per FMU. Extra released instances are freed.
+    """
+
+    def __init__(self, max_idle: int = 4):
+        """
+        Initialize an empty pool.
+
+        Args:
+            max_idle (int): Maximum number of idle instances kept per FMU. Default is 4.
+        """
+
+        self.max_idle = max_idle
+        self._idle = {}
+        self._counter = itertools.count(1)
+
+    def acquire(self, model_description, unzip_dir: str) -> FMU2Slave:
+        """
+        Return an FMU instance in the instantiated state, ready for `setupExperiment`.
+
+        Args:
+            model_description: The model description of the FMU.
+            unzip_dir (str): The directory holding the extracted FMU.
+
+        Returns:
+            FMU2Slave: A reset idle instance, or a newly instantiated one.
+        """
+
+        idle = self._idle.get(unzip_dir)
+        while idle:
+            fmu = idle.pop()
+            try:
+                fmu.reset()
+                return fmu
+            except Exception:
+                # An instance that cannot be reset is discarded
+                self.__free(fmu)
+
+        model_identifier = model_description.coSimulation.modelIdentifier
+        fmu = FMU2Slave(guid=model_description.guid,
+                        unzipDirectory=unzip_dir,
+                        modelIdentifier=model_identifier,
+                        instanceName=f"{model_identifier}_{os.getpid()}_{next(self._counter)}")
+        fmu.instantiate()
+        return fmu
+
+    def release(self, fmu: FMU2Slave):
+        """
+        Return a terminated instance to the pool, or free it when enough instances are idle.
+
+        Args:
+            fmu (FMU2Slave): An instance previously returned by `acquire`, after `terminate`.
+        """
+
+        idle = self._idle.setdefault(fmu.unzipDirectory, [])
+        if len(idle) < self.max_idle:
+            idle.append(fmu)
+        else:
+            self.__free(fmu)
+
+    def clear(self):
+        """
+        Free every idle instance.
+        """
+
+        for idle in self._idle.values():
+            while idle:
+                self.__free(idle.pop())
+
+    def __free(self, fmu: FMU2Slave):
+        try:
+            fmu.freeInstance()
+        except Exception:
+            pass
+
+
+# Pool shared by all FMUWrapper objects of the process
+default_pool = InstancePool()
+atexit.register(default_pool.clear)
@@ -0,0 +1,337 @@
+import math
+from typing import Dict, List
+
+
+class MetricAccumulator:
+    """
+    A control metric computed incrementally while the simulation runs, so that it does not need the
+    recorded trajectories. `update` is called once per recorded step with the state read for
+    recording and does O(1) work; `result` gives the value of the metric over the steps seen so far.
+
+    The metrics follow the definitions of `evaluation/src/metrics.py`, evaluated on the recorded
+    steps, so they match evaluating the saved results when the output windows are sampled.
+
+    Attributes:
+        name (str): The metric name, as in the evaluation statistics.
+        output_var (str): The controlled model variable.
+        target (float): The setpoint.
+    """
+
+    name = None
+
+    def __init__(self, output_var: str, target: float):
+        self.output_var = output_var
+        self.target = target
+
+    def variables(self) -> List[str]:
+        """
+        The model variables read by the metric.
+        """
+
+        return [self.output_var]
+
+    def bind(self, index: Dict[str, int]):
+        """
+        Resolve the positions of the metric variables in the state values and reset the metric.
+
+        Args:
+            index (Dict[str, int]): Position of each variable in the values, as `StateSnapshot.index`.
+
+        Raises:
+            NameError: If a variable is not found in the model description.
+        """
+
+        for var_name in self.variables():
+            if var_name not in index:
+                raise NameError(f"Variable '{var_name}' not found in the model description")
+        self._output = index[self.output_var]
+        self.reset()
+
+    def reset(self):
+        raise NotImplementedError
+
+    def update(self, time: float, values):
+        raise NotImplementedError
+
+    def result(self) -> float:
+        raise NotImplementedError
+
+
+class MeanSquareError(MetricAccumulator):
+    name = 'mean_square_error'
+
+    def reset(self):
+        self._sum = 0.0
+        self._steps = 0
+
+    def update(self, time, values):
+        error = self.target - values[self._output]
+        if error == error:  # NaN samples count as steps but not in the sum
+            self._sum += error * error
+        self._steps += 1
+
+    def result(self):
+        return self._sum / self._steps if self._steps else math.nan
+
+
+class EnergyConsumed(MetricAccumulator):
+    """
+    Energy in kWh, summing the heat source power of every step.
+    """
+
+    name = 'energy_consumed'
+
+    def __init__(self, output_var: str, target: float, power_var: str = 'heatSourcePower'):
+        super().__init__(output_var, target)
+        self.power_var = power_var
+
+    def variables(self):
+        return [self.output_var, self.power_var]
+
+    def bind(self, index):
+        super().bind(index)
+        self._power = index[self.power_var]
+
+    def reset(self):
+        self._sum = 0.0
+
+    def update(self, time, values):
+        power = values[self._power]
+        if power == power:
+            self._sum += power
+
+    def result(self):
+        return self._sum / (3600 * 1000)  # Convert to kWh
+
+
+class ComfortTime(MetricAccumulator):
+    """
+    Number of steps within 2.5% of the target.
+    """
+
+    name = 'comfort_time'
+
+    def reset(self):
+        self._steps = 0
+
+    def update(self, time, values):
+        if abs(values[self._output] - self.target) < 0.025 * self.target:
+            self._steps += 1
+
+    def result(self):
+        return self._steps
+
+
+class Overshoot(MetricAccumulator):
+    name = 'overshoot'
+
+    def reset(self):
+        self._max = -math.inf
+
+    def update(self, time, values):
+        output = values[self._output]
+        if output > self._max:
+            self._max = output
+
+    def result(self):
+        return self._max - self.target if self._max > -math.inf else math.nan
+
+
+class NumberOfOscillations(MetricAccumulator):
+    """
+    Number of crossings of the target, in either direction, between consecutive steps.
+    """
+
+    name = 'number_of_oscillations'
+
+    def reset(self):
+        self._count = 0
+        self._previous = None
+
+    def update(self, time, values):
+        output = values[self._output]
+        previous = self._previous
+        if previous is not None and ((output >= self.target and previous < self.target) or
+                                     (output <= self.target and previous > self.target)):
+            self._count += 1
+        self._previous = output
+
+    def result(self):
+        return self._count
+
+
+class RiseTime(MetricAccumulator):
+    """
+    Time of the first step at or above 98.5% of the target, or the last time if it is never reached.
+    """
+
+    name = 'rise_time'
+
+    def reset(self):
+        self._rise_time = None
+        self._last_time = math.nan
+
+    def update(self, time, values):
+        self._last_time = time
+        if self._rise_time is None and values[self._output] >= 0.985 * self.target:
+            self._rise_time = time
+
+    def result(self):
+        return self._rise_time if self._rise_time is not None else self._last_time
+
+
+class SettlingTime(MetricAccumulator):
+    """
+    Time from which the output stays within 2.5% of the target, found from its last exit of the band.
+    The steady state error and variance after settling are kept over the steps since that exit.
+    """
+
+    name = 'settling_time'
+
+    def reset(self):
+        self._settled_at = None
+        self._last_time = math.nan
+        self._steady_steps = 0
+        self._steady_mean = 0.0
+        self._steady_m2 = 0.0
+
+    def update(self, time, values):
+        self._last_time = time
+        output = values[self._output]
+        if abs(output - self.target) < 0.025 * abs(self.target):
+            if self._settled_at is None:
+                self._settled_at = time
+            # Welford update of the mean and variance of the steady values
+            self._steady_steps += 1
+            delta = output - self._steady_mean
+            self._steady_mean += delta / self._steady_steps
+            self._steady_m2 += delta * (output - self._steady_mean)
+        else:
+            # Leaving the band, or a NaN sample, restarts the steady state
+            self._settled_at = None
+            self._steady_steps = 0
+            self._steady_mean = 0.0
+            self._steady_m2 = 0.0
+
+    def result(self):
+        return self._settled_at if self._settled_at is not None else self._last_time
+
+
+class SteadyStateError(SettlingTime):
+    name = 'steady_state_error'
+
+    def result(self):
+        if self._steady_steps < 2:
+            return math.nan  # No data after settling time
+        return self._steady_mean - self.target
+
+
+class VarianceAfterSettling(SettlingTime):
+    name = 'variance_after_settling'
+
+    def result(self):
+        if self._steady_steps < 2:
+            return math.nan  # No data after settling time
+        return self._steady_m2 / self._steady_steps
+
+
+class RecoveryTime(MetricAccumulator):
+    """
+    Mean time to get back within 1.5% of the target after each disturbance, a disturbance ending
+    where the disturbance variable leaves state 2. A window that does not recover before the next one
+    counts its whole length.
+    """
+
+    name = 'recovery_time'
+
+    def __init__(self, output_var: str, target: float, disturbance_var: str = 'windowState'):
+        super().__init__(output_var, target)
+        self.disturbance_var = disturbance_var
+
+    def variables(self):
+        return [self.output_var, self.disturbance_var]
+
+    def bind(self, index):
+        super().bind(index)
+        self._disturbance = index[self.disturbance_var]
+
+    def reset(self):
+        self._sum = 0.0
+        self._windows = 0
+        self._start = None
+        self._recovered = False
+        self._previous_state = None
+        self._last_time = math.nan
+
+    def update(self, time, values):
+        state = values[self._disturbance]
+        if self._previous_state == 2 and state != 2:
+            if self._start is not None and not self._recovered:
+                self._sum += self._last_time - self._start
+            self._start = time
+            self._recovered = False
+            self._windows += 1
+        self._previous_state = state
+        self._last_time = time
+
+        if self._start is not None and not self._recovered and \
+                abs(self.target - values[self._output]) <= 0.015 * abs(self.target):
+            self._sum += time - self._start
+            self._recovered = True
+
+    def result(self):
+        if self._windows == 0:
+            return math.nan
+        total = self._sum
+        if not self._recovered:
+            total += self._last_time - self._start
+        return total / self._windows
+
+
+# Accumulators by metric name, in the order of the evaluation statistics
+ACCUMULATORS = {accumulator.name: accumulator for accumulator in (
+    SteadyStateError, MeanSquareError, Overshoot, RiseTime, SettlingTime, ComfortTime, EnergyConsumed,
+    VarianceAfterSettling, RecoveryTime, NumberOfOscillations)}
+
+
+def create_metrics(output_var: str, target: float, power_var: str = 'heatSourcePower',
+                   disturbance_var: str = 'windowState', names: List[str] = None) -> List[MetricAccumulator]:
+    """
+    Create accumulators for the given metrics of a controlled variable.
+
+    Args:
+        output_var (str): The controlled model variable.
+        target (float): The setpoint.
+        power_var (str): The model variable summed by the energy metric.
+        disturbance_var (str): The model variable whose state 2 marks a disturbance.
+        names (List[str]): The metric names. Default creates every metric of `ACCUMULATORS`.
+
+    Returns:
+        List[MetricAccumulator]: One accumulator per metric.
+
+    Raises:
+        ValueError: If a metric name is unknown.
+    """
+
+    names = list(ACCUMULATORS) if names is None else names
+    unknown = [name for name in names if name not in ACCUMULATORS]
+    if unknown:
+        raise ValueError(f"Unknown metrics {unknown}, expected some of {list(ACCUMULATORS)}")
+
+    metrics = []
+    for name in names:
+        if ACCUMULATORS[name] is EnergyConsumed:
+            metrics.append(EnergyConsumed(output_var, target, power_var))
+        elif ACCUMULATORS[name] is RecoveryTime:
+            metrics.append(RecoveryTime(output_var, target, disturbance_var))
+        else:
+            metrics.append(ACCUMULATORS[name](output_var, target))
+    return metrics
+
+
+def metric_results(metrics: List[MetricAccumulator]) -> Dict[str, float]:
+    """
+    Return the value of each metric, keyed by metric name.
+    """
+
+    return {metric.name: metric.result() for metric in metrics}
@@ -0,0 +1,111 @@
+import json
+import logging
+import time
+from bisect import bisect_right
+import numpy as np
+
+
+class SimulationTimer:
+    """
+    Cumulative per-phase timers and a per-step latency histogram for one simulation run.
+
+    Phases are timed with `lap`, which adds the time elapsed since a mark and returns a new mark, so a
+    loop can time consecutive phases with one clock read per phase boundary.
+
+    Attributes:
+        phases (Dict[str, float]): Cumulative seconds spent in each phase.
+        steps (int): Number of simulation steps timed.
+        step_time (float): Cumulative seconds spent in simulation steps.
+        max_step (float): Latency of the slowest step, in seconds.
+        edges (np.ndarray): Upper bounds of the latency histogram bins, in seconds. The last bin
+                            counts the steps slower than every bound.
+        counts (List[int]): Number of steps in each histogram bin.
+    """
+
+    # Log-spaced latency bins from 1 µs to 10 s, four per decade
+    EDGES = 10.0 ** np.arange(-6, 1.01, 0.25)
+
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self):
+        self.phases = {}
+        self.steps = 0
+        self.step_time = 0.0
+        self.max_step = 0.0
+        self.edges = self.EDGES
+        self._edges = self.EDGES.tolist()
+        self.counts = [0] * (len(self.EDGES) + 1)
+
+    def lap(self, phase: str, since: float) -> float:
+        """
+        Add the time elapsed since a mark to a phase.
+
+        Args:
+            phase (str): The phase name.
+            since (float): A mark returned by `clock` or by a previous `lap`.
+
+        Returns:
+            float: The current clock value, to be used as the next mark.
+        """
+
+        now = self.clock()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - since)
+        return now
+
+    def step(self, since: float):
+        """
+        Record the latency of a simulation step started at the given mark.
+        """
+
+        latency = self.clock() - since
+        self.steps += 1
+        self.step_time += latency
+        self.max_step = max(self.max_step, latency)
+        self.counts[bisect_right(self._edges, latency)] += 1
+
+    def to_dict(self) -> dict:
+        """
+        Summarize the timers as a JSON-serializable dictionary.
+        """
+
+        return {
+            "steps": self.steps,
+            "steps_per_second": self.steps / self.step_time if self.step_time > 0 else None,
+            "phases": self.phases,
+            "step_latency": {
+                "mean": self.step_time / self.steps if self.steps else None,
+                "max": self.max_step,
+                "edges": self.edges.tolist(),
+                "counts": self.counts,
+            },
+        }
+
+    def save(self, path: str):
+        """
+        Write the summary of the timers to a JSON file.
+        """
+
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Logging filter that lets through at most one record per interval from each logging call site,
+    so that per-step debug output does not flood the log or slow down long runs.
+
+    Attributes:
+        interval (float): Minimum number of seconds between two records of one call site.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        site = (record.pathname, record.lineno)
+        if record.created - self._last.get(site, float("-inf")) < self.interval:
+            return False
+        self._last[site] = record.created
+        return True
@@ -0,0 +1,265 @@
+from fnmatch import fnmatchcase
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+
+
+class RecordSpec:
+    """
+    Describes which variables a simulation records and at which rate.
+
+    The spec only thins out what is stored. Every `decimation` communication steps form one output
+    window, which is either sampled at its first step or reduced with an aggregation. Sampled windows
+    let the simulation loop step over the unrecorded steps, while aggregations need every step.
+
+    Attributes:
+        variables (List[str]): Variable names or glob patterns to record. None records every variable.
+        decimation (int): Number of communication steps per recorded row.
+        interval (float): Output interval in seconds, converted to a decimation factor for a given step size.
+        aggregation (str): None to sample each window, or one of 'min', 'max' and 'mean'.
+    """
+
+    AGGREGATIONS = ('min', 'max', 'mean')
+
+    def __init__(self, variables: List[str] = None, decimation: int = 1, interval: float = None,
+                 aggregation: str = None):
+        """
+        Initialize the record spec.
+
+        Args:
+            variables (List[str]): Variable names or glob patterns to record. Default records every variable.
+            decimation (int): Number of communication steps per recorded row. Default is 1.
+            interval (float): Output interval in seconds. Cannot be combined with a decimation factor.
+            aggregation (str): Aggregation of each output window ('min', 'max' or 'mean'). Default samples
+                               the first step of each window.
+
+        Raises:
+            ValueError: If the decimation, interval or aggregation are invalid.
+        """
+
+        if interval is not None and decimation != 1:
+            raise ValueError("Specify either a decimation factor or an output interval, not both")
+        if decimation < 1:
+            raise ValueError("decimation must be a positive integer")
+        if interval is not None and interval <= 0:
+            raise ValueError("interval must be a positive value")
+        if aggregation is not None and aggregation not in self.AGGREGATIONS:
+            raise ValueError(f"Unsupported aggregation '{aggregation}'. Choose one of {self.AGGREGATIONS}")
+
+        self.variables = variables
+        self.decimation = int(decimation)
+        self.interval = interval
+        self.aggregation = aggregation
+
+    def select(self, names: List[str], required: List[str] = None) -> List[str]:
+        """
+        Resolve the variable names and patterns of the spec against the model variables.
+
+        Args:
+            names (List[str]): The names of all model variables.
+            required (List[str]): Variables that must be recorded regardless of the spec, e.g. plot variables.
+
+        Returns:
+            List[str]: The selected variable names, in model order.
+
+        Raises:
+            NameError: If a name or pattern does not match any model variable.
+        """
+
+        if self.variables is None:
+            return list(names)
+
+        selected = set(required or [])
+        for pattern in self.variables:
+            # Names such as 'multiSum.u[1]' are matched literally before being treated as patterns
+            if pattern in names:
+                matches = [pattern]
+            else:
+                matches = [name for name in names if fnmatchcase(name, pattern)]
+            if not matches:
+                raise NameError(f"No model variable matches '{pattern}'")
+            selected.update(matches)
+        return [name for name in names if name in selected]
+
+    def decimation_for(self, step_size: float) -> int:
+        """
+        Return the number of communication steps per recorded row for a step size.
+
+        Raises:
+            ValueError: If the output interval is not a multiple of the step size.
+        """
+
+        if self.interval is None:
+            return self.decimation
+        decimation = round(self.interval / step_size)
+        if decimation < 1 or not np.isclose(decimation * step_size, self.interval):
+            raise ValueError(f"Output interval {self.interval} is not a multiple of the step size {step_size}")
+        return decimation
+
+
+class Recorder:
+    """
+    Columnar store for simulation results, backed by a single preallocated float64 array.
+
+    One row is written per output window and one column is kept per recorded variable, with the
+    simulation time of the window start in the last column. The buffer is sized from the simulation
+    horizon up front, so recording a step writes the snapshot into an existing row without allocating.
+
+    With a sink, the buffer only holds `sink.chunk_rows` rows: when it is full, its rows are appended
+    to the sink and the buffer is reused, so memory does not grow with the simulation horizon.
+
+    Integer and Boolean variables are buffered as floats and converted back to their type in
+    `to_dataframe` and in the sink, unless their windows are averaged.
+
+    Attributes:
+        columns (List[str]): The recorded variable names followed by 'time'.
+        dtypes (Dict[str, np.dtype]): The type of the recorded columns that are not float64.
+        n_rows (int): The number of rows in the buffer.
+        sink (ChunkWriter): The writer receiving full buffers, or None to keep every row in memory.
+        rows_flushed (int): The number of rows already appended to the sink.
+    """
+
+    def __init__(self, names: List[str], start_time: float, stop_time: float, step_size: float,
+                 spec: RecordSpec = None, required: List[str] = None, sink=None,
+                 dtypes: Dict[str, np.dtype] = None):
+        """
+        Allocate the result buffer for a simulation horizon.
+
+        Args:
+            names (List[str]): The names of all variables in the snapshot, in snapshot order.
+            start_time (float): The simulation start time.
+            stop_time (float): The simulation stop time.
+            step_size (float): The communication step size.
+            spec (RecordSpec): Which variables to record and how often. Default records everything at every step.
+            required (List[str]): Variables recorded regardless of the spec.
+            sink (ChunkWriter): Writer the rows are streamed to in chunks. Default keeps all rows.
+            dtypes (Dict[str, np.dtype]): The type of the variables that are not float64. Default is none.
+        """
+
+        if spec is None:
+            spec = RecordSpec()
+        selected = spec.select(names, required)
+        self.columns = selected + ['time']
+        self.decimation = spec.decimation_for(step_size)
+        self.aggregation = spec.aggregation
+        # Averaged windows of integer variables are not integers
+        self.dtypes = {} if self.aggregation == 'mean' else \
+            {name: dtype for name, dtype in (dtypes or {}).items() if name in selected}
+        # Positions of the recorded variables in the snapshot, None when all of them are kept
+        positions = {name: i for i, name in enumerate(names)}
+        self._positions = None if selected == list(names) else np.array([positions[name] for name in selected])
+        self._scratch = np.empty(len(selected), dtype=np.float64)
+
+        # One extra row absorbs the rounding of the accumulated simulation time
+        n_steps = int(np.floor((stop_time - start_time) / step_size)) + 2
+        capacity = -(-n_steps // self.decimation)
+        if sink is not None:
+            capacity = min(capacity, sink.chunk_rows)
+            sink.open(self.columns, self.dtypes)
+        self._data = np.empty((capacity, len(self.columns)), dtype=np.float64)
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        self._step = 0
+        self.n_rows = 0
+        self.sink = sink
+        self.rows_flushed = 0
+
+    def record(self, time: float, values: np.ndarray, step: int = None):
+        """
+        Add the values of one communication step to the current output window.
+
+        Args:
+            time (float): The simulation time of the step.
+            values (np.ndarray): The values of all snapshot variables.
+            step (int): The index of the step from the start of the simulation, when steps are skipped.
+                        Default is the step after the previously recorded one.
+        """
+
+        if step is not None:
+            self._step = step
+        window_step = self._step % self.decimation
+        self._step += 1
+
+        if self._positions is None:
+            selected = values
+        else:
+            selected = np.take(values, self._positions, out=self._scratch)
+
+        if window_step == 0:
+            if self.n_rows == len(self._data):
+                if self.sink is not None:
+                    # The previous window is complete, so the whole buffer can be written out
+                    self.flush()
+                else:
+                    self._data = np.concatenate([self._data, np.empty_like(self._data[:1])])
+            row = self._data[self.n_rows]
+            row[:-1] = selected
+            row[-1] = time
+            self.n_rows += 1
+            return
+
+        if self.aggregation is None:
+            return
+        row = self._data[self.n_rows - 1, :-1]
+        if self.aggregation == 'min':
+            np.minimum(row, selected, out=row)
+        elif self.aggregation == 'max':
+            np.maximum(row, selected, out=row)
+        else:
+            # Running mean over the steps of the window seen so far
+            delta = np.subtract(selected, row, out=self._scratch)
+            delta /= window_step + 1
+            row += delta
+
+    def flush(self):
+        """
+        Append the rows of the buffer to the sink and empty the buffer.
+        """
+
+        if self.n_rows:
+            self.sink.append(self._data[:self.n_rows])
+            self.rows_flushed += self.n_rows
+            self.n_rows = 0
+
+    def close(self):
+        """
+        Write the remaining rows and complete the sink output. Does nothing without a sink.
+        """
+
+        if self.sink is not None:
+            self.flush()
+            self.sink.close()
+
+    @property
+    def data(self) -> np.ndarray:
+        """
+        The recorded rows as a (rows x columns) view of the buffer.
+        """
+
+        return self._data[:self.n_rows]
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Return the recorded values of a variable as a view of the buffer.
+
+        Args:
+            name (str): The variable name, or 'time'.
+
+        Returns:
+            np.ndarray: The values of the variable at every recorded row.
+
+        Raises:
+            NameError: If the variable is not recorded.
+        """
+
+        if name not in self._index:
+            raise NameError(f"Variable '{name}' is not recorded")
+        return self._data[:self.n_rows, self._index[name]]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Return the recorded rows as a DataFrame with the variable types. Float columns share memory
+        with the buffer.
+        """
+
+        frame = pd.DataFrame(self.data, columns=self.columns, copy=False)
+        return frame.astype(self.dtypes) if self.dtypes else frame
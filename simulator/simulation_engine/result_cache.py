@@ -0,0 +1,225 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+# Default root of the result cache, shared by every campaign run from the same directory
+CACHE_DIR = os.environ.get("SIMULATION_RESULT_CACHE", "simulation_cache")
+# Bump when the layout of cached results changes, so older entries are not served
+CACHE_VERSION = 1
+
+ENTRY_FILE = "entry.json"
+PARTIAL_PREFIX = ".partial-"
+
+
+def canonical(value):
+    """
+    Convert a value to plain JSON data that is identical for equal values across processes: dict
+    keys and sets are sorted, arrays are replaced by their digest and objects by their attributes.
+    """
+
+    if isinstance(value, dict):
+        return {str(key): canonical(item) for key, item in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [canonical(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((canonical(item) for item in value), key=repr)
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        return {"dtype": str(array.dtype), "shape": list(array.shape),
+                "sha256": hashlib.sha256(array.tobytes()).hexdigest()}
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if callable(value) and hasattr(value, "__qualname__"):
+        return f"{getattr(value, '__module__', '')}.{value.__qualname__}"
+    if hasattr(value, "__dict__"):
+        return {"class": f"{type(value).__module__}.{type(value).__qualname__}", "state": canonical(vars(value))}
+    return repr(value)
+
+
+def tree_hash(*folders) -> str:
+    """
+    Return the digest of the Python sources under the given folders, so that code changes of the
+    packages a run depends on invalidate its cached results.
+    """
+
+    digest = hashlib.sha256()
+    for folder in folders:
+        sources = []
+        for dirpath, dirnames, filenames in os.walk(folder):
+            dirnames[:] = [name for name in dirnames if name != "__pycache__"]
+            sources.extend(os.path.join(dirpath, name) for name in filenames if name.endswith(".py"))
+        for path in sorted(sources):
+            digest.update(os.path.relpath(path, folder).encode())
+            with open(path, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def source_hash(obj) -> str:
+    """
+    Return the digest of the sources of the package defining the class of obj, e.g. a controller
+    and its helper modules. Empty when the source is not available.
+    """
+
+    try:
+        path = inspect.getsourcefile(type(obj))
+    except TypeError:
+        return ""
+    if path is None:
+        return ""
+    return tree_hash(os.path.dirname(os.path.abspath(path)))
+
+
+def cache_key(**inputs) -> str:
+    """
+    Return the SHA-256 digest of the canonical form of the given simulation inputs.
+    """
+
+    data = json.dumps(canonical(dict(inputs, cache_version=CACHE_VERSION)), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def _place(source: str, target: str):
+    """
+    Hard-link a file, or copy it when linking is not possible (e.g. across file systems).
+    """
+
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class ResultCache:
+    """
+    Content-addressed store of simulation results. Each entry holds the result files of one run,
+    keyed by a hash of everything the run depends on (see `cache_key`), so a run with the same
+    inputs is served from the cache instead of being simulated again. Keys cover the sources of the
+    simulator packages but not installed libraries such as FMPy or NumPy, so the cache should be
+    cleared or bypassed after upgrading them.
+
+    Entries are written to a private folder and renamed into place, so concurrent workers never
+    observe a partial entry. Serving an entry marks it as used; when the cache outgrows its size
+    limit, the least recently used entries are removed.
+
+    Attributes:
+        root (str): The cache folder.
+        max_bytes (int): Size limit of the cache, or None for no limit.
+    """
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = None):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def __entry(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def fetch(self, key: str, target_dir: str) -> bool:
+        """
+        Place the cached result files of a run in target_dir, replacing files of the same name.
+
+        Args:
+            key (str): The run key.
+            target_dir (str): The run folder.
+
+        Returns:
+            bool: Whether the run was in the cache.
+        """
+
+        entry = self.__entry(key)
+        try:
+            with open(os.path.join(entry, ENTRY_FILE)) as f:
+                files = json.load(f)["files"]
+        except (OSError, ValueError, KeyError):
+            return False
+
+        os.makedirs(target_dir, exist_ok=True)
+        for name in files:
+            target = os.path.join(target_dir, name)
+            if os.path.lexists(target):
+                os.remove(target)
+            _place(os.path.join(entry, name), target)
+        os.utime(os.path.join(entry, ENTRY_FILE))  # mark as recently used
+        return True
+
+    def store(self, key: str, source_dir: str, files, replace: bool = False):
+        """
+        Add the given result files of a run to the cache, then evict entries over the size limit.
+
+        Args:
+            key (str): The run key.
+            source_dir (str): The run folder.
+            files (List[str]): The names of the files to cache, relative to source_dir. Missing files are skipped.
+            replace (bool): Replace an existing entry for the key instead of keeping it.
+        """
+
+        entry = self.__entry(key)
+        if os.path.exists(os.path.join(entry, ENTRY_FILE)):
+            if not replace:
+                return
+            shutil.rmtree(entry, ignore_errors=True)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        partial = tempfile.mkdtemp(prefix=PARTIAL_PREFIX, dir=os.path.dirname(entry))
+        stored = []
+        size = 0
+        for name in files:
+            source = os.path.join(source_dir, name)
+            if os.path.isfile(source):
+                _place(source, os.path.join(partial, name))
+                stored.append(name)
+                size += os.path.getsize(source)
+        with open(os.path.join(partial, ENTRY_FILE), "w") as f:
+            json.dump({"files": stored, "bytes": size, "created": time.time()}, f)
+
+        try:
+            os.rename(partial, entry)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(partial, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        """
+        Return the complete entries as (last use, bytes, path) tuples.
+        """
+
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if name.startswith(PARTIAL_PREFIX):
+                    continue
+                entry_file = os.path.join(prefix_dir, name, ENTRY_FILE)
+                try:
+                    with open(entry_file) as f:
+                        size = json.load(f)["bytes"]
+                    entries.append((os.path.getmtime(entry_file), size, os.path.join(prefix_dir, name)))
+                except (OSError, ValueError, KeyError):
+                    continue  # removed concurrently or incomplete
+        return entries
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits its size limit.
+        """
+
+        if self.max_bytes is None:
+            return
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
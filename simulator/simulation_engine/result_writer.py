@@ -0,0 +1,358 @@
+import glob
+import importlib.util
+import json
+import os
+import shutil
+import zipfile
+import numpy as np
+import pandas as pd
+
+# Supported result formats, in the order `read_results` looks for them
+RESULT_FORMATS = ('npz', 'parquet', 'csv')
+# Name of the run metadata entry stored in columnar result files
+METADATA_KEY = '__metadata__'
+
+
+class ResultWriter:
+    """
+    Writes the recorded variables of a simulation run to a file.
+
+    Attributes:
+        extension (str): The file extension of the format, including the dot.
+    """
+
+    extension = None
+
+    def write(self, frame: pd.DataFrame, path: str, metadata: dict = None):
+        """
+        Write the results to a file, replacing it atomically.
+
+        Args:
+            frame (pd.DataFrame): The recorded variables, one column per variable including 'time'.
+            path (str): The file to write.
+            metadata (dict): Run metadata stored with the results, if the format supports it.
+        """
+
+        partial = f"{path}.partial"
+        self._write(frame, partial, metadata or {})
+        os.replace(partial, path)
+
+    def _write(self, frame, path, metadata):
+        raise NotImplementedError
+
+
+class CsvWriter(ResultWriter):
+    """
+    Text CSV with a header row. Run metadata is not stored in the file.
+    """
+
+    extension = '.csv'
+
+    def _write(self, frame, path, metadata):
+        frame.to_csv(path, index=False)
+
+
+class NpzWriter(ResultWriter):
+    """
+    Compressed NumPy archive with one `<variable>.npy` member per column, in column order, and the
+    run metadata as a `__metadata__.json` member. Members are compressed separately, so reading one
+    column with `np.load` decompresses only that column.
+    """
+
+    extension = '.npz'
+
+    def _write(self, frame, path, metadata):
+        self.write_columns(((name, frame[name].to_numpy()) for name in frame.columns), path, metadata)
+
+    @staticmethod
+    def write_columns(columns, path: str, metadata: dict):
+        """
+        Write (name, values) pairs as an archive, consuming them one at a time.
+        """
+
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, values in columns:
+                with archive.open(f"{name}.npy", 'w', force_zip64=True) as member:
+                    np.lib.format.write_array(member, values, allow_pickle=False)
+            archive.writestr(f"{METADATA_KEY}.json", json.dumps(metadata))
+
+
+class ParquetWriter(ResultWriter):
+    """
+    Parquet file with zstd compression, the run metadata being stored in the schema metadata.
+    Requires pyarrow.
+    """
+
+    extension = '.parquet'
+
+    def _write(self, frame, path, metadata):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("The parquet result format requires pyarrow") from e
+
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        schema_metadata = dict(table.schema.metadata or {})
+        schema_metadata[METADATA_KEY.encode()] = json.dumps(metadata).encode()
+        pq.write_table(table.replace_schema_metadata(schema_metadata), path, compression='zstd')
+
+
+class ChunkWriter:
+    """
+    Appendable writer that receives the results of a run in blocks of rows while it is simulated,
+    so that a run uses bounded memory and the rows already written survive an interruption.
+
+    Attributes:
+        path (str): The final result file.
+        metadata (dict): Run metadata stored with the results, if the format supports it.
+        chunk_rows (int): Number of rows the recorder buffers between two appends.
+        columns (List[str]): The column names, set by `open`.
+        dtypes (Dict[str, np.dtype]): The type of the columns that are not float64, set by `open`.
+    """
+
+    def __init__(self, path: str, metadata: dict = None, chunk_rows: int = 4096):
+        if chunk_rows < 1:
+            raise ValueError("chunk_rows must be a positive integer")
+        self.path = path
+        self.metadata = metadata or {}
+        self.chunk_rows = chunk_rows
+        self.columns = None
+        self.dtypes = {}
+
+    def open(self, columns, dtypes=None):
+        """
+        Start the output with the given column names, and the types of the columns whose float rows
+        are converted when written.
+        """
+
+        self.columns = list(columns)
+        self.dtypes = dict(dtypes or {})
+
+    def frame(self, rows: np.ndarray) -> pd.DataFrame:
+        """
+        Return a block of rows as a DataFrame with the column types.
+        """
+
+        frame = pd.DataFrame(rows, columns=self.columns, copy=False)
+        return frame.astype(self.dtypes) if self.dtypes else frame
+
+    def append(self, rows: np.ndarray):
+        """
+        Write a (rows x columns) block after the rows already written.
+        """
+
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Complete the output once the last block has been appended.
+        """
+
+
+class CsvChunkWriter(ChunkWriter):
+    """
+    Appends each block to the CSV file and flushes it, giving the same file as `CsvWriter`.
+    An existing file is replaced rather than truncated, as it may be linked into the result cache.
+    """
+
+    extension = CsvWriter.extension
+
+    def open(self, columns, dtypes=None):
+        super().open(columns, dtypes)
+        if os.path.lexists(self.path):
+            os.remove(self.path)
+        self._file = open(self.path, 'w', newline='')
+        pd.DataFrame(columns=self.columns).to_csv(self._file, index=False)
+        self._file.flush()
+
+    def append(self, rows):
+        self.frame(rows).to_csv(self._file, header=False, index=False)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class NpzChunkWriter(ChunkWriter):
+    """
+    Writes each block as a complete NPZ part in a `<name>.parts` folder next to the result file, and
+    merges the parts column by column into the `NpzWriter` format on close. The parts of an
+    interrupted run remain readable with `read_results`.
+    """
+
+    extension = NpzWriter.extension
+
+    def open(self, columns, dtypes=None):
+        super().open(columns, dtypes)
+        self.parts_dir = parts_dir(self.path)
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        os.makedirs(self.parts_dir)
+        self._parts = []
+
+    def append(self, rows):
+        part = os.path.join(self.parts_dir, f"part-{len(self._parts):06d}.npz")
+        NpzWriter().write(self.frame(rows), part, self.metadata)
+        self._parts.append((part, len(rows)))
+
+    def close(self):
+        # Gather the parts in a memory-mapped array on disk, reading each part once, then write it
+        # out one column at a time
+        merged = np.lib.format.open_memmap(os.path.join(self.parts_dir, "merged.npy"), mode='w+',
+                                           shape=(sum(n for _, n in self._parts), len(self.columns)))
+        row = 0
+        for part, n in self._parts:
+            with np.load(part) as data:
+                for j, name in enumerate(self.columns):
+                    merged[row:row + n, j] = data[name]
+            row += n
+
+        partial = f"{self.path}.partial"
+        NpzWriter.write_columns(((name, np.ascontiguousarray(merged[:, j], dtype=self.dtypes.get(name)))
+                                 for j, name in enumerate(self.columns)), partial, self.metadata)
+        del merged
+        os.replace(partial, self.path)
+        shutil.rmtree(self.parts_dir)
+
+
+WRITERS = {'csv': CsvWriter, 'npz': NpzWriter, 'parquet': ParquetWriter}
+CHUNK_WRITERS = {'csv': CsvChunkWriter, 'npz': NpzChunkWriter}
+
+
+def get_writer(result_format: str) -> ResultWriter:
+    """
+    Return the writer of a result format.
+
+    Raises:
+        ValueError: If the format is not supported.
+    """
+
+    if result_format not in WRITERS:
+        raise ValueError(f"Unsupported result format '{result_format}', expected one of {list(WRITERS)}")
+    return WRITERS[result_format]()
+
+
+def missing_dependency(result_format: str) -> str:
+    """
+    Return the optional package a result format needs when it is not installed, or None.
+    """
+
+    if result_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        return 'pyarrow'
+    return None
+
+
+def get_chunk_writer(result_format: str, path: str, metadata: dict = None, chunk_rows: int = 4096) -> ChunkWriter:
+    """
+    Return an appendable writer of a result format for the given result file.
+
+    Raises:
+        ValueError: If the format cannot be written in chunks.
+    """
+
+    if result_format not in CHUNK_WRITERS:
+        raise ValueError(f"Result format '{result_format}' cannot be streamed, expected one of {list(CHUNK_WRITERS)}")
+    return CHUNK_WRITERS[result_format](path, metadata, chunk_rows)
+
+
+def parts_dir(path: str) -> str:
+    """
+    Return the folder holding the parts of a result file written by `NpzChunkWriter`.
+    """
+
+    return f"{os.path.splitext(path)[0]}.parts"
+
+
+def remove_results(folder: str, name: str = "simulation_results"):
+    """
+    Remove the result files of a run in every format, and the parts of an interrupted streamed run,
+    so that results written in another format before are not read instead of the new ones.
+    """
+
+    for writer in WRITERS.values():
+        path = os.path.join(folder, f"{name}{writer.extension}")
+        if os.path.lexists(path):
+            os.remove(path)
+    shutil.rmtree(parts_dir(os.path.join(folder, name)), ignore_errors=True)
+
+
+def select_columns(names, columns=None):
+    """
+    Pick the stored column names matching the requested ones. A requested name matches a stored
+    name as is or with '.' replaced with '_', as used by the evaluation.
+
+    Args:
+        names (List[str]): The stored column names.
+        columns (List[str]): The requested columns. Default selects every column.
+
+    Returns:
+        List[str]: The matching stored names, in stored order.
+
+    Raises:
+        KeyError: If a requested column is not stored.
+    """
+
+    if columns is None:
+        return list(names)
+    wanted = set(columns)
+    selected = [name for name in names if name in wanted or name.replace('.', '_') in wanted]
+    found = set(selected) | {name.replace('.', '_') for name in selected}
+    missing = [column for column in columns if column not in found]
+    if missing:
+        raise KeyError(f"Columns {missing} not found in the simulation results")
+    return selected
+
+
+def read_metadata(path: str) -> dict:
+    """
+    Return the run metadata stored in a NPZ or Parquet result file, without reading its columns.
+    Empty for CSV files and files without metadata.
+    """
+
+    if path.endswith(NpzWriter.extension):
+        with np.load(path) as data:
+            member = f"{METADATA_KEY}.json"
+            return json.loads(bytes(data[member])) if member in data.files else {}
+    if path.endswith(ParquetWriter.extension):
+        import pyarrow.parquet as pq
+        metadata = (pq.read_schema(path).metadata or {}).get(METADATA_KEY.encode())
+        return json.loads(metadata) if metadata else {}
+    return {}
+
+
+def read_results(path: str, columns=None):
+    """
+    Read a result file written by any of the writers, decoding only the requested columns where
+    the format allows it. This is the reader of the simulator and of the evaluation.
+
+    Args:
+        path (str): The result file, or the parts folder of an interrupted streamed run.
+        columns (List[str]): The columns to read, see `select_columns`. Default reads every column.
+
+    Returns:
+        Tuple[pd.DataFrame, dict]: The results with their stored column names, and the run metadata,
+        empty for CSV files.
+
+    Raises:
+        KeyError: If a requested column is not stored.
+    """
+
+    if os.path.isdir(path):
+        # Parts of a streamed run that did not complete
+        pieces = [read_results(part, columns) for part in sorted(glob.glob(os.path.join(path, "part-*.npz")))]
+        if not pieces:
+            return pd.DataFrame(columns=columns), {}
+        return pd.concat([frame for frame, _ in pieces], ignore_index=True), pieces[0][1]
+    if path.endswith(NpzWriter.extension):
+        with np.load(path) as data:
+            names = [name for name in data.files if name != f"{METADATA_KEY}.json"]
+            metadata = json.loads(bytes(data[f"{METADATA_KEY}.json"])) if len(names) < len(data.files) else {}
+            frame = pd.DataFrame({name: data[name] for name in select_columns(names, columns)})
+        return frame, metadata
+    if path.endswith(ParquetWriter.extension):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=select_columns(pq.read_schema(path).names, columns))
+        metadata = (table.schema.metadata or {}).get(METADATA_KEY.encode())
+        return table.to_pandas(), json.loads(metadata) if metadata else {}
+    names = pd.read_csv(path, nrows=0).columns
+    return pd.read_csv(path, usecols=select_columns(names, columns)), {}
@@ -1,17 +1,24 @@
 import os
+import csv
 import json
 import importlib
 from simulation_engine.FMUWrapper import FMUWrapper
+from simulation_engine.result_writer import get_writer, get_chunk_writer
+from simulation_engine.online_metrics import metric_results
+from simulation_engine import fmu_cache
+from simulation_engine.result_cache import cache_key, source_hash, tree_hash
 
 CONFIG_DIR = "configs"
 
 class SimulationGenerator:
 
-    def __init__(self, scenario_name, duration, step_size, controller_type, simulation_id, seed):
+    def __init__(self, scenario_name, duration, step_size, controller_type, simulation_id, seed, timing=False,
+                 online_metrics=False, control_period=None):
 
         self.scenario_name = scenario_name
         self.duration = duration
         self.step_size = step_size
+        self.control_period = control_period
         self.simulation_id = simulation_id
         self.seed = seed
         self.controller_type = controller_type
@@ -20,7 +27,9 @@ class SimulationGenerator:
         self.simulation_events_path = self.__generate_events()
         self.simulation_events = self.__load_events(self.simulation_events_path)
         self.controller = self.__get_controller()
-        self.fmu_simulator = FMUWrapper(path=self.fmu_path, stop_time=self.duration, step_size=self.step_size)
+        self.metrics = self.__get_metrics() if online_metrics else None
+        self.fmu_simulator = FMUWrapper(path=self.fmu_path, stop_time=self.duration, step_size=self.step_size,
+                                        timing=timing)
         
     def __import_scenario(self):
         """
@@ -68,6 +77,15 @@ class SimulationGenerator:
        
         return self.scenario_module.setup_controller(self.controller_type)
     
+    def __get_metrics(self):
+        """
+        Initialize the online metrics defined by the scenario.
+        """
+        if not hasattr(self.scenario_module, "setup_metrics"):
+            raise AttributeError(f"Scenario '{self.scenario_name}' must define a 'setup_metrics' function for online metrics")
+
+        return self.scenario_module.setup_metrics()
+
     def __get_fmu_path(self):
         """
         Get the path to the FMU file based on the scenario name.
@@ -75,9 +93,40 @@ class SimulationGenerator:
         return self.scenario_module.get_fmu_path() 
     
     
-    def run_simulation(self, plot_vars=None):
+    def controller_metadata(self):
+        """
+        Describe the controller for the run metadata: a controller answering from a precomputed
+        control surface reports the largest interpolation error of the surface.
+        """
+        surface = getattr(self.controller, "surface", None)
+        if surface is None or surface.max_error is None:
+            return {}
+        return {"surface_max_error": surface.max_error}
+
+    def cache_key(self, **options):
+        """
+        Return the result cache key of the run: a hash of the scenario, controller type and parameters,
+        seed, duration, step size, control period, FMU binary and generated input schedule, together
+        with the given output options (e.g. record spec and result format). The sources of the
+        scenario package, the controller package and the simulation engine are part of the key.
+        """
+        code = tree_hash(os.path.dirname(os.path.abspath(self.scenario_module.__file__)),
+                         os.path.dirname(os.path.abspath(__file__)))
+        return cache_key(scenario=self.scenario_name, controller_type=self.controller_type,
+                         controller=self.controller, controller_source=source_hash(self.controller), code=code,
+                         seed=self.seed, duration=self.duration, step_size=self.step_size,
+                         control_period=self.control_period,
+                         fmu=fmu_cache.content_hash(self.fmu_path), inputs=self.simulation_events,
+                         metrics=self.metrics, **options)
+
+
+    def run_simulation(self, plot_vars=None, record=None, stream=None):
         """
         Run the FMU simulation with the generated input events and controller.
+        The optional record spec selects the recorded variables and their output rate, and the
+        optional stream (see `result_stream`) writes the results while the simulation runs.
+        The controller runs every control period, by default at every step.
+        With online metrics, they are updated at every recorded step and saved with `save_metrics`.
         """
                 
         self.fmu_simulator.initialize_fmu()
@@ -85,7 +134,11 @@ class SimulationGenerator:
         times, plot_data, simulation_data = self.fmu_simulator.simulate_with_controller(
             input_vars=self.simulation_events,
             controller=self.controller,
-            plot_vars= plot_vars if plot_vars else None
+            plot_vars= plot_vars if plot_vars else None,
+            record=record,
+            stream=stream,
+            metrics=self.metrics,
+            control_period=self.control_period
         )
 
         return times, plot_data, simulation_data
@@ -95,8 +148,67 @@ class SimulationGenerator:
         """
         Save the simulation results to a CSV file.
         """
-        self.fmu_simulator.save_results_to_csv(times, simulation_data, os.path.join(output_path, "simulation_results.csv"))
+        self.save_results(times, simulation_data, output_path, 'csv')
+
+
+    def result_stream(self, output_path, result_format='csv', metadata=None, chunk_rows=4096):
+        """
+        Return a writer streaming the results to simulation_results.<format> in output_path
+        every chunk_rows recorded rows, to be passed to `run_simulation`.
+        """
+        path = os.path.join(output_path, f"simulation_results{get_writer(result_format).extension}")
+        return get_chunk_writer(result_format, path, metadata, chunk_rows)
+
+
+    def discard_events(self):
+        """
+        Remove the generated input configuration, for runs whose results are served from the cache.
+        """
+        os.remove(self.simulation_events_path)
+
+
+    def save_results(self, times, simulation_data, output_path, result_format='csv', metadata=None):
+        """
+        Save the simulation results as simulation_results.<format>, with the run metadata stored in
+        the file by the columnar formats, and move the input configuration next to them.
+        Results that were streamed (simulation_data is None) are already written.
+        When timing is on, the time spent writing is added to the 'write_results' phase.
+        """
+        timer = self.fmu_simulator.timer
+        mark = timer.clock() if timer is not None else None
+        if simulation_data is not None:
+            writer = get_writer(result_format)
+            self.fmu_simulator.save_results(times, simulation_data,
+                                            os.path.join(output_path, f"simulation_results{writer.extension}"),
+                                            result_format, metadata)
         os.rename(self.simulation_events_path, os.path.join(output_path, "input_config.json"))
+        if timer is not None:
+            timer.lap('write_results', mark)
+
+
+    def save_metrics(self, output_path):
+        """
+        Save the online metrics of the last run as a single row of metrics.csv, when they are on.
+        """
+        if self.metrics is None:
+            return
+        results = metric_results(self.metrics)
+        path = os.path.join(output_path, "metrics.csv")
+        # Written next to the target and moved in place, so a file linked into the result cache is replaced
+        partial = f"{path}.partial"
+        with open(partial, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results))
+            writer.writeheader()
+            writer.writerow(results)
+        os.replace(partial, path)
+
+
+    def save_timing(self, output_path):
+        """
+        Save the per-phase timers of the last run as timing.json, when timing is on.
+        """
+        if self.fmu_simulator.timer is not None:
+            self.fmu_simulator.timer.save(os.path.join(output_path, "timing.json"))
 
 
     def plot_results(self, times, plot_data):
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The simulator modules are imported from the simulator folder, as when running simulate.py
+SIMULATOR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SIMULATOR_DIR not in sys.path:
+    sys.path.insert(0, SIMULATOR_DIR)
@@ -0,0 +1,58 @@
+import itertools
+import numpy as np
+import pytest
+import reference_fuzzy
+from controllers.fuzzy_controller import FuzzyLogicController
+from scenarios.room_heater.utils.fuzzy_config import fuzzy_config
+
+INPUTS = ["error", "outsideTemp", "roomAir.der_T"]
+SETPOINT = 20.0
+
+
+def grid_values(name, count, breakpoints=True):
+    """
+    Evenly spaced values across the universe of an input and past both of its ends, where the edge
+    membership functions saturate, optionally with every breakpoint of its membership functions.
+    """
+    low, high = fuzzy_config["inputs"][name]["range"]
+    margin = 0.1 * (high - low)
+    mfs = fuzzy_config["inputs"][name]["membership_functions"]
+    points = [point for mf in mfs.values() for point in mf] if breakpoints else []
+    return np.unique(np.concatenate((np.linspace(low - margin, high + margin, count), [low, high], points)))
+
+
+# Errors and error rates with the breakpoints where rules switch, the outside temperature coarsely
+GRID = np.array(list(itertools.product(grid_values("error", 21), grid_values("outsideTemp", 7, breakpoints=False),
+                                       grid_values("roomAir.der_T", 11))))
+
+
+def make_controller(controller_class):
+    return controller_class(config=fuzzy_config, target_var="measuredTemp", inputs=INPUTS, setpoint=SETPOINT)
+
+
+def model_variables(error, outside_temp, rate):
+    return {"measuredTemp": SETPOINT - error, "outsideTemp": outside_temp, "roomAir.der_T": rate}
+
+
+@pytest.fixture(scope="module")
+def expected():
+    reference = make_controller(reference_fuzzy.FuzzyLogicController)
+    return np.array([reference.update(model_variables(*row), 0.5)["heatSourcePower"] for row in GRID])
+
+
+def test_grid_reaches_output_extremes(expected):
+    # Zero output where no rule fires, up to the top of the output range when the room is cold
+    assert (expected == 0.0).any()
+    assert expected.max() > 1800.0
+
+
+def test_update_matches_reference_inference(expected):
+    controller = make_controller(FuzzyLogicController)
+    outputs = np.array([controller.update(model_variables(*row), 0.5)["heatSourcePower"] for row in GRID])
+    np.testing.assert_allclose(outputs, expected, rtol=1e-12, atol=1e-9)
+
+
+def test_update_batch_matches_reference_inference(expected):
+    controller = make_controller(FuzzyLogicController)
+    outputs = controller.update_batch(model_variables(*GRID.T), 0.5)["heatSourcePower"]
+    np.testing.assert_allclose(outputs, expected, rtol=1e-12, atol=1e-9)
@@ -0,0 +1,32 @@
+import copy
+import numpy as np
+import pytest
+from controllers.pid_controller import PIDController
+
+
+def make_pid():
+    return PIDController(control_input="measuredTemp", control_output="heatSourcePower",
+                         Kp=500, Ki=0.02, Kd=10, setpoint=20.0, max_output=2000.0)
+
+
+def test_batch_matches_scalar_updates():
+    measurements = np.array([[18.0, 19.5, 21.0], [18.2, 19.8, 20.9], [18.5, 20.1, 20.7]])
+    batched = make_pid()
+    members = [make_pid() for _ in range(measurements.shape[1])]
+    for row in measurements:
+        outputs = batched.update_batch({"measuredTemp": row}, 0.5)["heatSourcePower"]
+        expected = [pid.update({"measuredTemp": value}, 0.5)["heatSourcePower"] for pid, value in zip(members, row)]
+        assert outputs == pytest.approx(expected)
+
+
+def test_batch_keeps_scalar_state():
+    pid = make_pid()
+    pid.update({"measuredTemp": 19.0}, 0.5)
+    integral, prev_error = pid.integral, pid.prev_error
+    pid.update_batch({"measuredTemp": np.array([18.0, 19.0])}, 0.5)
+    assert (pid.integral, pid.prev_error) == (integral, prev_error)
+
+    branch = copy.deepcopy(pid)
+    output = branch.update({"measuredTemp": 19.0}, 0.5)["heatSourcePower"]
+    assert np.isscalar(output)
+    assert output == pid.update({"measuredTemp": 19.0}, 0.5)["heatSourcePower"]
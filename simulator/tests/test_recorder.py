@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from simulation_engine.FMUWrapper import StateSnapshot
+from simulation_engine.recorder import Recorder, RecordSpec
+from simulation_engine.result_writer import CsvChunkWriter, CsvWriter, get_chunk_writer, get_writer, read_results
+
+NAMES = ['roomAir.T', 'windowState', 'normalNoise.enableNoise']
+DTYPES = {'windowState': np.dtype(np.int32), 'normalNoise.enableNoise': np.dtype(np.bool_)}
+
+
+def record(recorder, steps=6):
+    for step in range(steps):
+        recorder.record(step * 0.5, np.array([291.15 + step, step % 3, step % 2]))
+    recorder.close()
+
+
+def test_integer_columns_keep_their_type():
+    recorder = Recorder(NAMES, 0.0, 2.5, 0.5, dtypes=DTYPES)
+    record(recorder)
+    frame = recorder.to_dataframe()
+    assert frame['windowState'].dtype == np.int32
+    assert frame['normalNoise.enableNoise'].dtype == np.bool_
+    assert frame['roomAir.T'].dtype == np.float64
+    assert list(frame['windowState']) == [0, 1, 2, 0, 1, 2]
+
+
+def test_snapshot_types_follow_model_description():
+    snapshot = StateSnapshot({'roomAir.T': {'type': 'Real', 'valueReference': 0},
+                              'windowState': {'type': 'Integer', 'valueReference': 1},
+                              'normalNoise.enableNoise': {'type': 'Boolean', 'valueReference': 2}})
+    assert snapshot.dtypes == DTYPES
+
+
+@pytest.mark.parametrize("result_format", ["csv", "npz"])
+@pytest.mark.parametrize("streamed", [False, True])
+def test_boolean_columns_are_read_back_as_bool(tmp_path, result_format, streamed):
+    path = str(tmp_path / f"simulation_results{get_writer(result_format).extension}")
+    if streamed:
+        recorder = Recorder(NAMES, 0.0, 2.5, 0.5, sink=get_chunk_writer(result_format, path, chunk_rows=4),
+                            dtypes=DTYPES)
+        record(recorder)
+    else:
+        recorder = Recorder(NAMES, 0.0, 2.5, 0.5, dtypes=DTYPES)
+        record(recorder)
+        get_writer(result_format).write(recorder.to_dataframe(), path)
+
+    frame, _ = read_results(path)
+    assert frame['normalNoise.enableNoise'].dtype == np.bool_
+    assert list(frame['normalNoise.enableNoise']) == [False, True, False, True, False, True]
+    assert frame['windowState'].dtype.kind == 'i'
+
+
+def test_averaged_integer_columns_stay_float():
+    recorder = Recorder(NAMES, 0.0, 2.5, 0.5, spec=RecordSpec(decimation=2, aggregation='mean'), dtypes=DTYPES)
+    record(recorder)
+    assert list(recorder.to_dataframe()['windowState']) == pytest.approx([0.5, 1.0, 1.5])
+
+
+def test_streamed_csv_matches_written_csv(tmp_path):
+    recorder = Recorder(NAMES, 0.0, 2.5, 0.5, dtypes=DTYPES)
+    record(recorder)
+    CsvWriter().write(recorder.to_dataframe(), str(tmp_path / "written.csv"))
+
+    streamed = Recorder(NAMES, 0.0, 2.5, 0.5, sink=CsvChunkWriter(str(tmp_path / "streamed.csv"), chunk_rows=4),
+                        dtypes=DTYPES)
+    record(streamed)
+    assert (tmp_path / "streamed.csv").read_text() == (tmp_path / "written.csv").read_text()
+    assert "\n291.15,0,False,0.0\n" in (tmp_path / "written.csv").read_text()
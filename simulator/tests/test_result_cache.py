@@ -0,0 +1,97 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import simulate
+import scenarios.room_heater.room_heater as room_heater
+from simulation_engine.result_cache import tree_hash
+
+FMU_PATH = os.path.join(os.path.dirname(os.path.abspath(room_heater.__file__)), "fmu", "RoomHeater.fmu")
+
+
+def offline_temperature(day, month, start_time, end_time):
+    index = pd.date_range(pd.Timestamp(2023, month, day, start_time), periods=5, freq='h')
+    return pd.DataFrame({'temp': 5.0 + 0.5 * np.arange(5)}, index=index)
+
+
+@pytest.fixture
+def campaign(tmp_path, monkeypatch):
+    """
+    Run simulation 1 of a short room heater campaign in a temporary folder, returning its run folder.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(room_heater, "simulate_temperature", offline_temperature)
+    monkeypatch.setattr(room_heater, "get_fmu_path", lambda: FMU_PATH)
+
+    def run(*options, online_metrics=True):
+        args, record = simulate.parse_args(["--scenario", "room_heater", "--n", "1", "--duration", "1200",
+                                            "--step_size", "1", "--controller", "pid",
+                                            "--cache_dir", str(tmp_path / "cache"), *options] +
+                                           (["--online_metrics"] if online_metrics else []))
+        if args.lockstep:
+            simulate.run_lockstep(args, record)
+        else:
+            simulate.run_simulation(args, 0, record)
+        return tmp_path / "simulation_results" / "room_heater" / args.controller / "sim_1"
+    return run
+
+
+def read_files(sim_folder):
+    return {name: (sim_folder / name).read_bytes() for name in ("simulation_results.csv", "metrics.csv")}
+
+
+@pytest.mark.parametrize("uncached_options", [["--no_cache"], ["--no_cache", "--stream"], ["--timing"]])
+def test_uncached_run_does_not_change_cache_entry(campaign, uncached_options):
+    cached = read_files(campaign())
+    # A different run in the same folder, bypassing the cache
+    uncached = read_files(campaign(*uncached_options, "--control_period", "5"))
+    assert uncached["metrics.csv"] != cached["metrics.csv"]
+
+    sim_folder = campaign()
+    assert '"cached": true' in (sim_folder / "metadata.json").read_text()
+    assert read_files(sim_folder) == cached
+
+
+def test_cache_hit_matches_simulation(campaign):
+    simulated = read_files(campaign("--no_cache"))
+    campaign()
+    sim_folder = campaign()
+    assert '"cached": true' in (sim_folder / "metadata.json").read_text()
+    assert read_files(sim_folder) == simulated
+
+
+def test_tree_hash_follows_sources(tmp_path):
+    (tmp_path / "utils").mkdir()
+    (tmp_path / "utils" / "helper.py").write_text("SCALE = 1\n")
+    (tmp_path / "__pycache__").mkdir()
+    digest = tree_hash(tmp_path)
+
+    (tmp_path / "__pycache__" / "helper.cpython-311.pyc").write_bytes(b"compiled")
+    (tmp_path / "notes.txt").write_text("not a source")
+    assert tree_hash(tmp_path) == digest
+
+    (tmp_path / "utils" / "helper.py").write_text("SCALE = 2\n")
+    assert tree_hash(tmp_path) != digest
+
+
+@pytest.mark.parametrize("rerun_options", [["--format", "csv"], ["--format", "csv", "--no_cache"],
+                                           ["--format", "csv", "--lockstep"]])
+def test_rerun_in_another_format_replaces_results(campaign, rerun_options):
+    sim_folder = campaign("--format", "npz", "--stream", "--chunk_rows", "100", online_metrics=False)
+    # Parts of an interrupted streamed run are removed as well
+    (sim_folder / "simulation_results.parts").mkdir()
+    campaign(*rerun_options, online_metrics=False)
+    assert sorted(path.name for path in sim_folder.glob("simulation_results*")) == ["simulation_results.csv"]
+
+
+@pytest.mark.parametrize("options", [["--no_cache"], [], ["--lockstep"]])
+def test_lookup_controller_reports_interpolation_error(campaign, options):
+    sim_folder = campaign("--controller", "fuzzy_lookup", *options, online_metrics=False)
+    metadata = json.loads((sim_folder / "metadata.json").read_text())
+    assert metadata["surface_max_error"] > 0
+
+
+def test_exact_controller_has_no_interpolation_error(campaign):
+    sim_folder = campaign("--no_cache", online_metrics=False)
+    assert "surface_max_error" not in json.loads((sim_folder / "metadata.json").read_text())
@@ -0,0 +1,36 @@
+import importlib.util
+import numpy as np
+import pandas as pd
+import pytest
+import simulate
+from simulation_engine import result_writer
+from simulation_engine.result_writer import get_writer, read_results, read_metadata
+
+FRAME = pd.DataFrame({'temperatureSensor.T': [291.15, 291.2], 'windowState': [2.0, 0.0], 'time': [0.0, 0.5]})
+
+
+@pytest.mark.parametrize("result_format", ["csv", "npz"])
+def test_read_selected_columns(tmp_path, result_format):
+    path = str(tmp_path / f"simulation_results{get_writer(result_format).extension}")
+    get_writer(result_format).write(FRAME, path, {"seed": 3})
+
+    frame, metadata = read_results(path, ['time', 'temperatureSensor_T'])
+    # Stored names and order are kept, whichever spelling was requested
+    assert list(frame.columns) == ['temperatureSensor.T', 'time']
+    assert np.array_equal(frame.to_numpy(), FRAME[['temperatureSensor.T', 'time']].to_numpy())
+    expected = {} if result_format == "csv" else {"seed": 3}
+    assert metadata == expected
+    assert read_metadata(path) == expected
+
+    with pytest.raises(KeyError):
+        read_results(path, ['heatSourcePower'])
+
+
+def test_parquet_without_pyarrow_is_rejected(monkeypatch, capsys):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(result_writer.importlib.util, "find_spec",
+                        lambda name, *args: None if name == "pyarrow" else find_spec(name, *args))
+    with pytest.raises(SystemExit):
+        simulate.parse_args(["--scenario", "room_heater", "--n", "1", "--duration", "10", "--step_size", "1",
+                             "--controller", "pid", "--format", "parquet"])
+    assert "requires pyarrow" in capsys.readouterr().err